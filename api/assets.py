@@ -0,0 +1,95 @@
+"""
+建立 Flex Message 使用的靜態圖示: 依 Flex 實際顯示的大小縮小並壓縮，檔名加上內容雜湊值，
+回覆中的網址因此可以永久快取，圖示更新後網址也會跟著改變
+對照表(manifest.json)不存在時使用 static 下的原始檔案
+
+python -m api.assets (需要 Pillow)
+"""
+import glob
+import hashlib
+import json
+import os
+
+from api.fileutil import atomic_write
+
+STATIC_DIRECTORY = "./static"
+DIST_DIRECTORY = "./static/dist"
+MANIFEST_PATH = "./static/dist/manifest.json"
+# 各資料夾圖示的最大邊長(px): 天氣圖示最大以 image size md(100px)顯示，建議圖示以 xxs(40px)顯示，保留約 3 倍的解析度
+ICON_SIZES = {"weather_icons": 300, "suggestion_icons": 128}
+
+
+class AssetManifest:
+    """
+    靜態圖示的原始路徑與內容雜湊檔名的對照
+    """
+    def __init__(self, files: dict = None):
+        self.files = files or {}
+        self.built = set(self.files.values())
+
+    @classmethod
+    def from_file(cls, path: str = MANIFEST_PATH):
+        """Returns 讀取對照表，不存在時回傳空的對照表(使用原始檔案)
+        AssetManifest: 對照表
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+    def url(self, url_root: str, path: str):
+        """Returns 圖示的網址，有建立過的圖示使用內容雜湊檔名
+        path: static 下的路徑(如 weather_icons/day01.jpg)
+        """
+        built = self.files.get(path)
+        return f"{url_root}assets/{built}" if built else f"{url_root}static/{path}"
+
+
+def optimize_icon(path: str, size: int):
+    """Returns 縮小並壓縮後的圖示
+    bytes: 檔案內容
+    """
+    import io
+    from PIL import Image
+    with Image.open(path) as image:
+        image.load()
+    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    if path.endswith(".jpg"):
+        image.convert("RGB").save(output, "JPEG", quality=82, optimize=True, progressive=True)
+    else:
+        # 圖示的顏色不多，轉為調色盤(保留透明度)可再減少一半以上的大小
+        image.convert("RGBA").quantize(256, method=Image.Quantize.FASTOCTREE).save(output, "PNG", optimize=True)
+    return output.getvalue()
+
+
+def build_assets(static_directory: str = STATIC_DIRECTORY, dist_directory: str = DIST_DIRECTORY, manifest_path: str = MANIFEST_PATH):
+    """Returns 建立所有圖示與對照表，並移除不再使用的舊檔案
+    dict: 原始路徑 -> (原始大小, 建立後大小)
+    """
+    manifest, sizes = {}, {}
+    for folder, size in ICON_SIZES.items():
+        for path in sorted(glob.glob(os.path.join(static_directory, folder, "*"))):
+            data = optimize_icon(path, size)
+            name, extension = os.path.splitext(os.path.basename(path))
+            built = f"{folder}/{name}.{hashlib.sha1(data).hexdigest()[:10]}{extension}"
+            os.makedirs(os.path.join(dist_directory, folder), exist_ok=True)
+            with open(os.path.join(dist_directory, built), "wb") as f:
+                f.write(data)
+            manifest[f"{folder}/{os.path.basename(path)}"] = built
+            sizes[f"{folder}/{os.path.basename(path)}"] = (os.path.getsize(path), len(data))
+
+    for path in glob.glob(os.path.join(dist_directory, "*", "*")):
+        if os.path.relpath(path, dist_directory).replace(os.sep, "/") not in manifest.values():
+            os.remove(path)
+    with atomic_write(manifest_path, encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return sizes
+
+
+if __name__ == "__main__":
+    sizes = build_assets()
+    before = sum(size[0] for size in sizes.values())
+    after = sum(size[1] for size in sizes.values())
+    print(f"Built {len(sizes)} icons: {before / 1024:.0f} KB -> {after / 1024:.0f} KB ({1 - after / before:.0%} smaller)")
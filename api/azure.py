@@ -1,20 +1,50 @@
 import os
+import re
+import time
+import unicodedata
 #Azure CLU
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
 from azure.ai.language.conversations import ConversationAnalysisClient
+from api.cache import TTLCache
+from api.metrics import metrics, ProfiledThreadPoolExecutor
 
 class AzureService:
-    def __init__(self):
+    def __init__(self, cache_size=1024, cache_ttl=86400, timeout=10, max_workers=4, http_client=None):
         # Azure CLU Settings
         self.azureKeyCredential = AzureKeyCredential(os.getenv("AZURE_CLU_API_KEY"))
         self.azureEndpoint = os.getenv("AZURE_CLU_ENDPOINT")
         self.azureProjectName = os.getenv("AZURE_CLU_PROJECT_NAME")
         self.azureDeploymentName = os.getenv("AZURE_CLU_DEPLOYMENT_NAME")
+        # 整個程序共用同一個 client，保留連線避免每次重新建立 TLS 連線
+        transport = RequestsTransport(session=http_client.session, session_owner=False) if http_client else None
+        self.client = ConversationAnalysisClient(self.azureEndpoint, self.azureKeyCredential, transport=transport)
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        # 正規化後的地址 -> CLU 分析結果
+        self.prediction_cache = TTLCache(cache_size)
+        self.max_workers = max_workers
+        self.executor = None
 
+    @metrics.timed("analyze_address")
     def analyze_address(self, address):
-        client = ConversationAnalysisClient(self.azureEndpoint, self.azureKeyCredential)
-        with client:
-            result = client.analyze_conversation(
+        return self.prediction_cache.get(
+            normalize_address(address),
+            lambda: self.analyze_conversation(address),
+            lambda result: time.time() + self.cache_ttl
+        )
+
+    def analyze_addresses(self, addresses: list):
+        """Returns 同時分析多個地址
+        list: 各地址的分析結果(順序與輸入相同)
+        """
+        if self.executor is None:
+            self.executor = ProfiledThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="azure-clu")
+        return list(self.executor.map(self.analyze_address, addresses))
+
+    def analyze_conversation(self, address):
+        with metrics.call("clu"):
+            result = self.client.analyze_conversation(
                 task={
                     "kind": "Conversation",
                     "analysisInput": {
@@ -32,6 +62,19 @@ class AzureService:
                         "deploymentName": self.azureDeploymentName,
                         "verbose": True
                     }
-                }
+                },
+                connection_timeout=self.timeout,
+                read_timeout=self.timeout
             )
-        return result['result']
\ No newline at end of file
+        return result['result']
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.client.close()
+
+
+# 正規化地址作為快取的 key(全半形、空白與台/臺)
+def normalize_address(address: str):
+    address = unicodedata.normalize("NFKC", address)
+    return re.sub(r"\s+", "", address).replace("台", "臺")
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+    """
+    有容量上限的 LRU 快取，每筆資料有各自的到期時間
+    到期後仍先回傳舊資料，並在背景更新(stale-while-revalidate)，超過 max_stale 的舊資料視為未命中
+    同一個 key 同時間只會有一個載入中的請求，其餘呼叫共用結果
+    """
+    def __init__(self, maxsize: int = 256, max_stale: float = None):
+        """
+        maxsize: 最多保存的資料筆數
+        max_stale: 到期後仍可回傳舊資料的秒數(None 表示不限制，0 表示到期後等待重新載入)
+        """
+        self.maxsize = maxsize
+        self.max_stale = max_stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._loading = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, loader, expires_at):
+        """Returns 取得快取資料，沒有資料時呼叫 loader 載入，到期時在背景重新載入
+        loader: 載入資料的函式
+        expires_at: 依資料計算到期時間(timestamp)的函式
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now < entry[1]:
+                    self.hits += 1
+                    return entry[0]
+                # 過舊的資料不回傳，等待重新載入
+                if self.max_stale is not None and now >= entry[1] + self.max_stale:
+                    entry = None
+            if entry is not None:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+            future, owner = self._loading.get(key), False
+            if future is None:
+                future, owner = Future(), True
+                self._loading[key] = future
+
+        if entry is not None:
+            if owner:
+                threading.Thread(target=self._load, args=(key, loader, expires_at, future), daemon=True).start()
+            return entry[0]
+        if owner:
+            self._load(key, loader, expires_at, future)
+        return future.result()
+
+    def set(self, key, value, expires_at: float):
+        """
+        寫入資料，超過容量時移除最久未使用的資料
+        """
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Returns 快取的命中、未命中與移除次數
+        dict: 統計資料
+        """
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _load(self, key, loader, expires_at, future):
+        try:
+            value = loader()
+            # 取得失敗(空資料)時不寫入，保留原本的舊資料
+            if value:
+                self.set(key, value, expires_at(value))
+            future.set_result(value)
+        except Exception as e:
+            print(f"Failed to load {key}: {e}")
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
@@ -0,0 +1,85 @@
+import queue
+import threading
+import time
+
+
+class EventDispatcher:
+    """
+    將 webhook 的處理工作放入有上限的佇列，由固定數量的背景執行緒處理
+    佇列已滿時等待 put_timeout 秒，仍無空間則直接在呼叫端處理(背壓)
+    """
+    def __init__(self, workers: int = 4, queue_size: int = 100, put_timeout: float = 1):
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(queue_size)
+        self.counts = {"submitted": 0, "processed": 0, "inline": 0, "errors": 0}
+        self.wait_time = {"total": 0.0, "max": 0.0}
+        self.process_time = {"total": 0.0, "max": 0.0}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """
+        啟動背景執行緒
+        """
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"event-dispatcher-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, item):
+        """Returns 將 func(item) 交給背景執行緒處理
+        item: webhook 的事件清單或 (body, signature)
+        bool: 是否放入佇列(False 表示佇列已滿，已在呼叫端處理完畢)
+        """
+        with self._lock:
+            self.counts["submitted"] += 1
+        try:
+            self.queue.put((time.perf_counter(), func, item), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.counts["inline"] += 1
+            self._process(time.perf_counter(), func, item)
+            return False
+
+    def stats(self):
+        """Returns 佇列深度、等待時間與處理時間
+        dict: 統計資料
+        """
+        with self._lock:
+            processed = self.counts["processed"] or 1
+            return {
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "workers": self.workers,
+                **self.counts,
+                "wait_avg": self.wait_time["total"] / processed,
+                "wait_max": self.wait_time["max"],
+                "process_avg": self.process_time["total"] / processed,
+                "process_max": self.process_time["max"]
+            }
+
+    def _work(self):
+        while True:
+            enqueued_at, func, item = self.queue.get()
+            try:
+                self._process(enqueued_at, func, item)
+            finally:
+                self.queue.task_done()
+
+    def _process(self, enqueued_at, func, item):
+        started = time.perf_counter()
+        error = False
+        try:
+            func(item)
+        except Exception as e:
+            print(f"Failed to handle webhook: {e}")
+            error = True
+        finished = time.perf_counter()
+        with self._lock:
+            self.counts["processed"] += 1
+            self.counts["errors"] += error
+            for stat, value in ((self.wait_time, started - enqueued_at), (self.process_time, finished - started)):
+                stat["total"] += value
+                stat["max"] = max(stat["max"], value)
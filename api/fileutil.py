@@ -0,0 +1,21 @@
+"""
+建置指令(python -m api.snapshot、api.assets、api.town_locator)共用的檔案工具
+"""
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", **kwargs):
+    """
+    先寫入暫存檔再替換，避免其他程序讀取到寫到一半的檔案；寫入失敗時保留原本的檔案
+    mode, kwargs: 傳給 open 的參數
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,78 @@
+import glob
+import json
+import os
+import re
+
+# 匹配 {{variable}} 的正規表達式
+VARIABLE_PATTERN = re.compile(r'\{\{([a-zA-Z0-9_]*)\}\}')
+
+
+class FlexTemplate:
+    """
+    預先編譯的 Flex Message 模板，將模板切成固定文字與變數欄位，一次填入所有變數
+    變數值為 list 時依出現順序填入第 n 個欄位，其他值則填入所有同名欄位；沒有值的欄位保留 {{variable}}
+    """
+    __slots__ = ("parts", "slots")
+
+    def __init__(self, text: str):
+        self.parts = []  # 固定文字與變數欄位交錯，變數欄位位於奇數位置
+        self.slots = []  # (part 位置, 變數名稱, 同名變數的第幾個)
+        occurrences = {}
+        last = 0
+        for match in VARIABLE_PATTERN.finditer(text):
+            self.parts.append(text[last:match.start()])
+            key = match.group(1)
+            self.slots.append((len(self.parts), key, occurrences.get(key, 0)))
+            occurrences[key] = occurrences.get(key, 0) + 1
+            self.parts.append(match.group(0))
+            last = match.end()
+        self.parts.append(text[last:])
+
+    @classmethod
+    def load(cls, path: str):
+        """Returns 讀取 JSON 模板並編譯(與 json.load/json.dumps 後的字串相同)
+        FlexTemplate: 模板
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.dumps(json.load(f)))
+
+    @classmethod
+    def from_snapshot(cls, data: tuple):
+        """Returns 由 to_snapshot 的結果還原模板(不需重新解析)
+        FlexTemplate: 模板
+        """
+        template = cls.__new__(cls)
+        template.parts, template.slots = data
+        return template
+
+    def to_snapshot(self):
+        """Returns 只包含內建型別的模板資料，供 api.snapshot 儲存
+        tuple: (parts, slots)
+        """
+        return self.parts, self.slots
+
+    def render(self, variables: dict):
+        """Returns 填入變數後的 Flex Message JSON 字串
+        str: JSON 字串
+        """
+        parts = self.parts.copy()
+        for index, key, occurrence in self.slots:
+            value = variables.get(key)
+            if isinstance(value, (list, tuple)):
+                if occurrence >= len(value):
+                    continue
+                value = value[occurrence]
+            elif value is None:
+                continue
+            parts[index] = str(value).replace('\n', '')
+        return "".join(parts)
+
+
+def load_templates(directory: str = "./flex"):
+    """Returns 讀取並編譯資料夾中所有的 Flex Message 模板
+    dict: 檔名(不含副檔名) -> FlexTemplate
+    """
+    return {
+        os.path.splitext(os.path.basename(path))[0]: FlexTemplate.load(path)
+        for path in sorted(glob.glob(os.path.join(directory, "*.json")))
+    }
@@ -0,0 +1,133 @@
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+
+TAIPEI = timezone(timedelta(hours=8))
+
+# 12小時天氣預報要取得的天氣因子: ElementName -> {結果欄位: ElementValue欄位}
+FORECAST_ELEMENTS = {
+    "天氣現象": {"Wx_desc": "Weather", "Wx_code": "WeatherCode"},
+    "12小時降雨機率": {"PoP12h": "ProbabilityOfPrecipitation"},
+    "最低溫度": {"MinT": "MinTemperature"},
+    "最高溫度": {"MaxT": "MaxTemperature"},
+    "最低體感溫度": {"MinAT": "MinApparentTemperature"},
+    "最高體感溫度": {"MaxAT": "MaxApparentTemperature"},
+    "平均相對濕度": {"RH": "RelativeHumidity"},
+    "紫外線指數": {"UVI": "UVIndex"},
+    "風速": {"WS": "BeaufortScale"}
+}
+
+# 以天氣現象的時間區段作為各時段的起始時間
+TIME_ELEMENT = "天氣現象"
+
+FORECAST_FIELDS = ("start_time",) + tuple(
+    field for fields in FORECAST_ELEMENTS.values() for field in fields
+)
+
+
+class ForecastPeriod:
+    """
+    單一時段的預報資料(suggestions 為預先計算的穿搭與天氣建議)
+    """
+    __slots__ = FORECAST_FIELDS + ("suggestions",)
+
+    def __init__(self, start_time, Wx_desc, Wx_code, PoP12h, MinT, MaxT, MinAT, MaxAT, RH, UVI, WS):
+        self.start_time = start_time
+        self.Wx_desc = Wx_desc
+        self.Wx_code = Wx_code
+        self.PoP12h = PoP12h
+        self.MinT = MinT
+        self.MaxT = MaxT
+        self.MinAT = MinAT
+        self.MaxAT = MaxAT
+        self.RH = RH
+        self.UVI = UVI
+        self.WS = WS
+        self.suggestions = None
+
+
+class Forecast(Mapping):
+    """
+    單一鄉鎮的12小時天氣預報，資料以時段(ForecastPeriod)保存
+    仍可用 forecast["MinT"][i] 的方式讀取，與原本 dict of list 的格式相容
+    """
+    __slots__ = ("periods",)
+
+    def __init__(self, periods: list):
+        self.periods = periods
+
+    def __getitem__(self, key):
+        if key not in FORECAST_FIELDS:
+            raise KeyError(key)
+        return [getattr(period, key) for period in self.periods]
+
+    def __iter__(self):
+        return iter(FORECAST_FIELDS)
+
+    def __len__(self):
+        return len(FORECAST_FIELDS)
+
+    def __bool__(self):
+        return bool(self.periods)
+
+    @classmethod
+    def from_rows(cls, rows: list):
+        """Returns 由 to_rows 的結果還原預報資料
+        Forecast: 預報資料
+        """
+        periods = []
+        for row, suggestions in rows:
+            period = ForecastPeriod(parse_time(row[0]) if row[0] else None, *row[1:])
+            period.suggestions = (suggestions[0], suggestions[1]) if suggestions else None
+            periods.append(period)
+        return cls(periods)
+
+    def to_rows(self):
+        """Returns 只包含內建型別的預報資料(可存為 JSON)
+        list: [[各欄位的值], 建議] (時間為 ISO 格式字串)
+        """
+        return [
+            [
+                [period.start_time.isoformat() if period.start_time else None] + [getattr(period, field) for field in FORECAST_FIELDS[1:]],
+                period.suggestions
+            ]
+            for period in self.periods
+        ]
+
+    def key(self, count: int = None):
+        """Returns 前 count 個時段的預報內容(可作為快取的 key，內容相同即為同一次發布的預報)
+        tuple: 各時段各欄位的值
+        """
+        return tuple(tuple(getattr(period, field) for field in FORECAST_FIELDS) for period in self.periods[:count])
+
+    @classmethod
+    def from_location(cls, location: dict):
+        """Returns 走訪一次 CWA 回傳的 Location 建立各時段的預報資料
+        Forecast: 預報資料
+        """
+        elements = {element["ElementName"]: element["Time"] for element in location["WeatherElement"]}
+        start_times = [parse_time(time["StartTime"]) for time in elements.get(TIME_ELEMENT, [])]
+        # 各天氣因子依序對應到各時段(與原本逐一呼叫時相同)，缺少的時段補 None
+        columns = []
+        for name, fields in FORECAST_ELEMENTS.items():
+            values = [time["ElementValue"][0] for time in elements.get(name, [])]
+            values += [None] * (len(start_times) - len(values))
+            for key in fields.values():
+                columns.append([value[key] if value else None for value in values])
+        periods = [ForecastPeriod(*row) for row in zip(start_times, *columns)]
+        return cls(periods)
+
+
+# 轉換時間格式(與 WeatherService.convert_time_format 相同，回傳不含時區的時間)
+def parse_time(time_str):
+    return datetime.fromisoformat(time_str).replace(tzinfo=None)
+
+
+# 解析整個縣市的預報資料
+def parse_county(data: dict):
+    """Returns 縣市內各鄉鎮的預報資料
+    dict: town -> Forecast
+    """
+    return {
+        location["LocationName"]: Forecast.from_location(location)
+        for location in data["records"]["Locations"][0]["Location"]
+    }
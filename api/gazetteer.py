@@ -0,0 +1,151 @@
+import json
+import re
+
+# 整個市共用的郵遞區號(新竹市東區、北區、香山區皆為 300，嘉義市東區、西區皆為 600)，無法以郵遞區號判斷鄉鎮
+SHARED_POSTAL_CODES = {"300", "600"}
+
+
+class Gazetteer:
+    """
+    以字典樹在本機比對地址中的縣市與鄉鎮，無法明確判斷時才交給 Azure CLU
+    """
+    def __init__(self):
+        self.trie = {}
+        self.towns = {}  # city -> {town}
+        self.postal_codes = {}  # 郵遞區號前三碼 -> (city, town)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_files(cls, cities, address_path="./Address.json"):
+        """Returns 以縣市清單與 Address.json 標註的鄉鎮建立比對器
+        cities: 縣市名稱(WeatherService.api_map)
+        """
+        with open(address_path, "r", encoding="utf-8") as f:
+            return cls.from_items(cities, json.load(f))
+
+    @classmethod
+    def from_items(cls, cities, items: list):
+        """Returns 以縣市清單與標註過的地址建立比對器
+        items: Address.json 格式的地址
+        """
+        gazetteer = cls()
+        for city in cities:
+            gazetteer.add(city, "city", city)
+        for item in items:
+            spans = {
+                entity["category"]: normalize(item["text"][entity["offset"]:entity["offset"] + entity["length"]])
+                for entity in item["entities"]
+            }
+            if "city" in spans and "town" in spans:
+                gazetteer.add(spans["town"], "town", spans["city"])
+                postal_code = re.match(r"\d{3}", item["text"])
+                if postal_code and postal_code.group(0) not in SHARED_POSTAL_CODES:
+                    # 同一個郵遞區號對應到多個鄉鎮時無法判斷，記為 None
+                    place = (spans["city"], spans["town"])
+                    code = postal_code.group(0)
+                    gazetteer.postal_codes[code] = place if gazetteer.postal_codes.get(code, place) == place else None
+        return gazetteer
+
+    @classmethod
+    def from_snapshot(cls, data: dict):
+        """Returns 由 to_snapshot 的結果還原比對器(不需重新讀取 Address.json)
+        Gazetteer: 比對器
+        """
+        gazetteer = cls()
+        gazetteer.trie = data["trie"]
+        gazetteer.towns = data["towns"]
+        gazetteer.postal_codes = data["postal_codes"]
+        return gazetteer
+
+    def to_snapshot(self):
+        """Returns 只包含內建型別的比對資料，供 api.snapshot 儲存
+        dict: 字典樹、各縣市的鄉鎮與郵遞區號
+        """
+        return {"trie": self.trie, "towns": self.towns, "postal_codes": self.postal_codes}
+
+    def add(self, name: str, category: str, city: str):
+        """
+        加入縣市或鄉鎮名稱
+        """
+        node = self.trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node.setdefault(None, set()).add((category, city))
+        if category == "town":
+            self.towns.setdefault(city, set()).add(name)
+
+    def scan(self, text: str):
+        """Returns 由左至右取最長的比對結果
+        list: (比對到的名稱, {(category, city)})
+        """
+        text = normalize(text)
+        matches = []
+        i = 0
+        while i < len(text):
+            node, end, found = self.trie, i, None
+            while end < len(text) and text[end] in node:
+                node = node[text[end]]
+                end += 1
+                if None in node:
+                    found = (end, node[None])
+            if found:
+                matches.append((text[i:found[0]], found[1]))
+                i = found[0]
+            else:
+                i += 1
+        return matches
+
+    def match(self, text: str):
+        """Returns 與 AzureService.analyze_address 相同格式的結果，無法明確判斷時回傳 None
+        dict: {"prediction": {"entities": [...]}}
+        """
+        cities, towns = set(), set()
+        for name, payloads in self.scan(text):
+            for category, city in payloads:
+                if category == "city":
+                    cities.add(city)
+                else:
+                    towns.add((city, name))
+
+        result = None
+        if len(cities) == 1:
+            city = cities.pop()
+            in_city = {town for town_city, town in towns if town_city == city}
+            if not in_city:
+                # 沒有比對到鄉鎮時，以郵遞區號判斷
+                postal_code = re.match(r"\s*(\d{3})", text)
+                postal = self.postal_codes.get(postal_code.group(1)) if postal_code else None
+                if postal and postal[0] == city:
+                    in_city = {postal[1]}
+            if len(in_city) == 1:
+                result = self.entities(city, in_city.pop())
+        # 只有鄉鎮時不判斷縣市: 鄉鎮名稱只來自 Address.json，不完整(如中正區、西區、大安區在多個縣市都有)，交給 CLU
+
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    def entities(self, city: str, town: str):
+        return {
+            "prediction": {
+                "entities": [
+                    {"category": "city", "text": city, "extraInformation": [{"key": city}]},
+                    {"category": "town", "text": town}
+                ]
+            }
+        }
+
+    def stats(self):
+        """Returns 本機比對的命中率
+        dict: 統計資料
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+# 統一縣市鄉鎮名稱的異體字
+def normalize(text: str):
+    return text.replace("台", "臺")
@@ -0,0 +1,64 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """
+    所有對外呼叫共用的連線池(keep-alive)，統一設定連線池大小、逾時與重試
+    """
+    def __init__(self, pool_size: int = 10, timeout: float = 10, retries: int = 2, backoff_factor: float = 0.3):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            raise_on_status=False
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=self.retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # 名稱 -> urllib3 PoolManager，用於統計連線重複使用的次數
+        self.pool_managers = {"requests": adapter.poolmanager}
+
+    def get(self, url: str, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def mount(self, prefix: str, name: str, **retry_options):
+        """
+        以不同的重試設定處理特定位址(例如由呼叫端自行處理 429 的 API)
+        """
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=self.retry.new(**retry_options))
+        self.session.mount(prefix, adapter)
+        self.pool_managers[name] = adapter.poolmanager
+
+    def register(self, name: str, pool_manager):
+        """
+        加入其他 SDK 的 urllib3 PoolManager 一併統計
+        """
+        self.pool_managers[name] = pool_manager
+
+    def stats(self):
+        """Returns 各連線池的請求數、新建連線數與重複使用的次數
+        dict: name -> 統計資料
+        """
+        result = {}
+        for name, pool_manager in self.pool_managers.items():
+            requests_count, connections = 0, 0
+            for key in pool_manager.pools.keys():
+                pool = pool_manager.pools.get(key)
+                if pool is not None:
+                    requests_count += pool.num_requests
+                    connections += pool.num_connections
+            result[name] = {
+                "requests": requests_count,
+                "new_connections": connections,
+                "reused_connections": max(requests_count - connections, 0)
+            }
+        return result
+
+    def close(self):
+        self.session.close()
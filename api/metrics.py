@@ -0,0 +1,228 @@
+import bisect
+import functools
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# 各階段耗時的直方圖區間(秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metrics:
+    """
+    輕量的各階段耗時與對外呼叫次數統計，以 Prometheus 文字格式輸出
+    """
+    def __init__(self, prefix: str = "weatherbot", enabled: bool = True, buckets: tuple = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.buckets = buckets
+        self.stages = {}  # stage -> [各區間次數..., 總秒數, 次數]
+        self.requests = Counter()  # upstream -> 呼叫次數
+        self.errors = Counter()  # upstream -> 失敗次數
+        self.collectors = []  # (name, type, help, func)
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """
+        記錄一次階段耗時
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stat = self.stages.setdefault(stage, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                stat[index] += 1
+            stat[-2] += seconds
+            stat[-1] += 1
+
+    def count(self, upstream: str, error: bool = False):
+        """
+        記錄一次對外呼叫(與是否失敗)
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.requests[upstream] += 1
+            if error:
+                self.errors[upstream] += 1
+
+    @contextmanager
+    def call(self, upstream: str):
+        """
+        記錄區塊中的對外呼叫，發生例外時計為失敗
+        """
+        try:
+            yield
+        except Exception:
+            self.count(upstream, error=True)
+            raise
+        self.count(upstream)
+
+    @contextmanager
+    def span(self, stage: str):
+        """
+        計算區塊的耗時
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        """
+        計算函式耗時的裝飾器
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register(self, name: str, type: str, help: str, func):
+        """
+        加入其他統計資料，func 回傳 [(labels, value), ...]
+        """
+        self.collectors.append((name, type, help, func))
+
+    def render(self):
+        """Returns Prometheus 文字格式的統計資料
+        str: 統計資料
+        """
+        lines = []
+        stage_name = f"{self.prefix}_stage_seconds"
+        lines += [f"# HELP {stage_name} Time spent in each request stage.", f"# TYPE {stage_name} histogram"]
+        with self._lock:
+            stages = {stage: list(stat) for stage, stat in self.stages.items()}
+            requests, errors = dict(self.requests), dict(self.errors)
+        for stage, stat in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, stat):
+                cumulative += count
+                lines.append(f'{stage_name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{stage_name}_bucket{{stage="{stage}",le="+Inf"}} {stat[-1]}')
+            lines.append(f'{stage_name}_sum{{stage="{stage}"}} {stat[-2]}')
+            lines.append(f'{stage_name}_count{{stage="{stage}"}} {stat[-1]}')
+
+        for name, help, values in (
+            ("outbound_requests_total", "Outbound calls per upstream.", requests),
+            ("outbound_errors_total", "Failed outbound calls per upstream.", errors)
+        ):
+            lines += [f"# HELP {self.prefix}_{name} {help}", f"# TYPE {self.prefix}_{name} counter"]
+            lines += [f'{self.prefix}_{name}{{upstream="{upstream}"}} {value}' for upstream, value in sorted(values.items())]
+
+        for name, type, help, func in self.collectors:
+            lines += [f"# HELP {self.prefix}_{name} {help}", f"# TYPE {self.prefix}_{name} {type}"]
+            for labels, value in func():
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{self.prefix}_{name}{{{label_text}}} {value}" if label_text else f"{self.prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    以固定間隔取樣指定執行緒的呼叫堆疊，輸出 collapsed stack 格式(可用於 flame graph)
+    該執行緒透過 ProfiledThreadPoolExecutor 提交的工作，執行期間也一併取樣(堆疊以執行緒的名稱開頭)
+    """
+    _local = threading.local()  # 目前執行緒所屬的分析器
+
+    def __init__(self, thread_id: int = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.threads = Counter({self.thread_id: 1})  # 取樣中的執行緒 -> 執行中的工作數
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = getattr(__class__._local, "profiler", None)
+        __class__._local.profiler = self
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        __class__._local.profiler = self._previous
+        self._stop.set()
+        self._thread.join()
+
+    @classmethod
+    def propagate(cls, func):
+        """Returns 目前執行緒正在被取樣時，包裝 func 使執行 func 的執行緒在執行期間一併被取樣
+        function: 包裝後的函式(未在取樣時為原本的函式)
+        """
+        profiler = getattr(cls._local, "profiler", None)
+        if profiler is None:
+            return func
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            with profiler.attach():
+                return func(*args, **kwargs)
+        return run
+
+    @contextmanager
+    def attach(self):
+        """
+        在區塊執行期間一併取樣目前的執行緒(區塊中再提交的工作也會被取樣)
+        """
+        thread_id = threading.get_ident()
+        previous = getattr(__class__._local, "profiler", None)
+        __class__._local.profiler = self
+        with self._lock:
+            self.threads[thread_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.threads[thread_id] -= 1
+                if self.threads[thread_id] <= 0:
+                    del self.threads[thread_id]
+            __class__._local.profiler = previous
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                thread_ids = list(self.threads)
+            names = {thread.ident: thread.name for thread in threading.enumerate()} if len(thread_ids) > 1 else {}
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({frame.f_code.co_filename.rsplit('/', 1)[-1]}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                # 其他執行緒的堆疊以執行緒池的名稱(去掉編號)開頭，與原本的執行緒區分
+                if thread_id != self.thread_id:
+                    stack.append(names.get(thread_id, "thread").rsplit("_", 1)[0])
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Returns collapsed stack 格式的取樣結果
+        str: 每行為 "堆疊 次數"
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class ProfiledThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    提交工作的執行緒正在被取樣分析(SamplingProfiler)時，執行該工作的執行緒在執行期間一併被取樣
+    """
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(SamplingProfiler.propagate(fn), *args, **kwargs)
+
+
+# 整個程序共用的統計
+metrics = Metrics()
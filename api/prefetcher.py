@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from api.forecast import parse_county
+from api.scheduler import RequestScheduler
+
+
+class ForecastPrefetcher:
+    """
+    在背景依 CWA 發布時間取得各縣市的12小時天氣預報，
+    並以 (city, town) 建立索引存放在 WeatherService.forecast_index
+    """
+    def __init__(self, weather_service, jitter: float = 120, backoff: float = 30, max_backoff: float = 1800):
+        self.weather_service = weather_service
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cities = list(weather_service.api_map.keys())
+        self.next_run = {city: 0 for city in self.cities}  # city -> 下次更新的 timestamp
+        self.updated_at = {}  # city -> 最後更新成功的 timestamp
+        self.failures = {city: 0 for city in self.cities}
+        self.totals = {"refreshes": 0, "shared": 0, "errors": 0, "bytes": 0, "fetch_time": 0.0, "parse_time": 0.0, "index_time": 0.0}
+        self.last_cycle = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        啟動背景更新
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.warm_start()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="forecast-prefetcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        停止背景更新
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def warm_start(self):
+        """Returns 由共用的快照載入尚未到期的縣市預報(其他程序已取得的資料不需重新取得)
+        int: 載入的縣市數
+        """
+        if not self.weather_service.store:
+            return 0
+        return sum(self._load_stored(city) for city in self.cities)
+
+    def _load_stored(self, city):
+        """Returns 由共用的快照載入其他程序已取得且尚未到期的縣市預報
+        bool: 是否已載入
+        """
+        forecasts, expires_at = self.weather_service.store.get_county(city)
+        if not forecasts or expires_at <= time.time():
+            return False
+        self._update_index(city, forecasts, expires_at)
+        return True
+
+    def ready(self):
+        """Returns 是否所有縣市都已取得預報
+        bool: 索引是否完整
+        """
+        return len(self.updated_at) == len(self.cities)
+
+    def stats(self):
+        """Returns 索引狀態與更新所花費的資源
+        dict: 統計資料
+        """
+        now = time.time()
+        return {
+            "ready": self.ready(),
+            "towns": len(self.weather_service.forecast_index),
+            "counties": {
+                city: {
+                    "age": round(now - self.updated_at[city], 1) if city in self.updated_at else None,
+                    "next_run": round(self.next_run[city] - now, 1),
+                    "failures": self.failures[city]
+                }
+                for city in self.cities
+            },
+            "last_cycle": self.last_cycle,
+            "totals": self.totals
+        }
+
+    def refresh_all(self):
+        """Returns 更新所有縣市一次的耗費
+        dict: 更新的縣市數、位元組數與各階段時間
+        """
+        return self.refresh(self.cities)
+
+    def refresh(self, cities: list):
+        """Returns 更新指定縣市的耗費
+        dict: 向 CWA 更新的縣市數(counties)、使用其他程序已寫入快照的縣市數(shared)、位元組數與各階段時間
+        """
+        cycle = {"counties": 0, "shared": 0, "errors": 0, "bytes": 0, "fetch_time": 0.0, "parse_time": 0.0, "index_time": 0.0}
+        for city in cities:
+            try:
+                self._refresh_city(city, cycle)
+            except Exception as e:
+                print(f"Failed to prefetch weather data for {city}: {e}")
+                self._schedule_retry(city)
+                cycle["errors"] += 1
+        for key in cycle:
+            self.totals["refreshes" if key == "counties" else key] += cycle[key]
+        self.last_cycle = cycle
+        return cycle
+
+    def _refresh_city(self, city, cycle):
+        service = self.weather_service
+
+        start = time.perf_counter()
+        # 其他程序已取得且尚未到期的縣市直接使用共用的快照，不重新向 CWA 取得
+        if service.store and self._load_stored(city):
+            cycle["shared"] += 1
+            cycle["index_time"] += time.perf_counter() - start
+            return
+        response = service.fetch_county_forecast(city, RequestScheduler.BACKGROUND)
+        fetched = time.perf_counter()
+        cycle["fetch_time"] += fetched - start
+        if not response:
+            self._schedule_retry(city)
+            cycle["errors"] += 1
+            return
+        cycle["bytes"] += len(response.content)
+
+        forecasts = parse_county(response.json())
+        service.suggestion_engine.annotate(forecasts.values())
+        parsed = time.perf_counter()
+        cycle["parse_time"] += parsed - fetched
+
+        expires_at = min((service.forecast_expires_at(forecast) for forecast in forecasts.values() if forecast), default=0)
+        self._update_index(city, forecasts, expires_at)
+        if service.store:
+            service.store.put_forecasts(city, forecasts, expires_at, replace=True)
+        cycle["index_time"] += time.perf_counter() - parsed
+        cycle["counties"] += 1
+
+    def _update_index(self, city, forecasts, expires_at):
+        service = self.weather_service
+        # 建立新的索引後再整個替換，讀取端不需要加鎖
+        index = {key: forecast for key, forecast in service.forecast_index.items() if key[0] != city}
+        index.update(((city, town), forecast) for town, forecast in forecasts.items())
+        service.forecast_index = index
+        service.forecast_index_expires[city] = expires_at
+
+        now = time.time()
+        self.updated_at[city] = now
+        self.failures[city] = 0
+        # 加上隨機延遲，避免所有縣市(與所有程序)在發布時間同時更新
+        self.next_run[city] = max(expires_at, now) + random.uniform(0, self.jitter)
+
+    def _schedule_retry(self, city):
+        self.failures[city] += 1
+        delay = min(self.backoff * 2 ** (self.failures[city] - 1), self.max_backoff)
+        self.next_run[city] = time.time() + delay + random.uniform(0, self.jitter)
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.time()
+            due = [city for city in self.cities if self.next_run[city] <= now]
+            if due:
+                self.refresh(due)
+            self._stop.wait(max(min(self.next_run.values()) - time.time(), 1))
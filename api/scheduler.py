@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+
+class RequestScheduler:
+    """
+    依 API 配額排程對外呼叫: 以 token bucket 限制每秒請求數，使用者的請求優先於背景更新，
+    相同優先權依先後順序；相同 key(URL)同時間只送出一次，其餘呼叫共用結果
+    超過最長等待時間仍未取得配額時回傳 None，由呼叫端改用快取資料
+    """
+    USER = 0
+    BACKGROUND = 1
+
+    def __init__(self, rate: float = 5, burst: int = 10, max_wait: dict = None):
+        """
+        rate: 每秒可送出的請求數(<= 0 表示不限制)
+        burst: 可累積的請求數
+        max_wait: 優先權 -> 最長等待秒數
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = {self.USER: 3, self.BACKGROUND: 60, **(max_wait or {})}
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.counts = {"submitted": 0, "merged": 0, "sent": 0, "rejected": 0, "paused": 0}
+        self.wait_time = {priority: {"total": 0.0, "max": 0.0, "count": 0} for priority in self.max_wait}
+        self._waiting = []  # [priority, 順序, 截止時間, key] 的 heap
+        self._tickets = {}  # key -> 等待中的 ticket
+        self._inflight = {}  # key -> Future
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def submit(self, key, func, priority: int = USER):
+        """Returns 取得配額後呼叫 func 的結果，等待逾時則回傳 None
+        key: 合併相同請求的 key(通常為 URL)
+        """
+        with self._cond:
+            self.counts["submitted"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counts["merged"] += 1
+                # 使用者的請求加入等待中的背景請求時，提高其優先權並縮短截止時間
+                ticket = self._tickets.get(key)
+                if ticket is not None and priority < ticket[0]:
+                    ticket[0] = priority
+                    ticket[2] = min(ticket[2], time.monotonic() + self.max_wait[priority])
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                ticket = [priority, next(self._sequence), time.monotonic() + self.max_wait[priority], key]
+                self._tickets[key] = ticket
+                heapq.heappush(self._waiting, ticket)
+                owner = True
+        if not owner:
+            return future.result()
+
+        try:
+            result = func() if self._acquire(ticket) else None
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def pause(self, seconds: float):
+        """
+        API 回應配額已用完(429)時，暫停所有請求並清空配額
+        """
+        with self._cond:
+            self.counts["paused"] += 1
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        """Returns 配額、等待中的請求數與各優先權的等待時間
+        dict: 統計資料
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "tokens": round(self.tokens, 2),
+                "waiting": len(self._waiting),
+                "inflight": len(self._inflight),
+                **self.counts,
+                "wait": {
+                    "user" if priority == self.USER else "background": {
+                        "avg": stat["total"] / stat["count"] if stat["count"] else 0.0,
+                        "max": stat["max"]
+                    }
+                    for priority, stat in self.wait_time.items()
+                }
+            }
+
+    def _acquire(self, ticket):
+        started = time.monotonic()
+        with self._cond:
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] is ticket and now >= self.paused_until and (self.rate <= 0 or self.tokens >= 1):
+                        heapq.heappop(self._waiting)
+                        if self.rate > 0:
+                            self.tokens -= 1
+                        self.counts["sent"] += 1
+                        self._record_wait(ticket[0], now - started)
+                        return True
+                    if now >= ticket[2]:
+                        self._waiting.remove(ticket)
+                        heapq.heapify(self._waiting)
+                        self.counts["rejected"] += 1
+                        self._record_wait(ticket[0], now - started)
+                        return False
+                    # 等到下一個配額、暫停結束或截止時間(排在前面的請求離開時會通知)
+                    timeout = ticket[2] - now
+                    if self._waiting[0] is ticket:
+                        ready_at = max(self.paused_until, now + (1 - self.tokens) / self.rate if self.rate > 0 else now)
+                        timeout = min(timeout, ready_at - now)
+                    self._cond.wait(max(timeout, 0.001))
+            finally:
+                self._tickets.pop(ticket[3], None)
+                self._cond.notify_all()
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _record_wait(self, priority, seconds):
+        stat = self.wait_time[priority]
+        stat["total"] += seconds
+        stat["max"] = max(stat["max"], seconds)
+        stat["count"] += 1
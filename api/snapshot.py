@@ -0,0 +1,79 @@
+"""
+預先建立 Flex 模板與地名比對資料的快照，冷啟動時直接載入，不需重新解析 JSON 與建立字典樹
+快照只包含內建型別，並記錄來源檔案的雜湊值，來源變更後自動改為讀取原始檔案
+
+python -m api.snapshot [snapshot.pickle]
+"""
+import glob
+import hashlib
+import os
+import pickle
+import sys
+
+from api.fileutil import atomic_write
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_PATH = "./snapshot.pickle"
+FLEX_DIRECTORY = "./flex"
+ADDRESS_PATH = "./Address.json"
+
+
+def source_files(flex_directory: str = FLEX_DIRECTORY, address_path: str = ADDRESS_PATH):
+    """Returns 快照的來源檔案
+    list: 檔案路徑
+    """
+    return sorted(glob.glob(os.path.join(flex_directory, "*.json"))) + [address_path]
+
+
+def source_digest(paths: list):
+    """Returns 來源檔案名稱與內容的雜湊值
+    str: sha1
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode())
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_snapshot(path: str = SNAPSHOT_PATH, flex_directory: str = FLEX_DIRECTORY, address_path: str = ADDRESS_PATH):
+    """Returns 建立並寫入快照
+    dict: 快照內容
+    """
+    from api.flex_template import load_templates
+    from api.gazetteer import Gazetteer
+    from api.weather import WeatherService
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "digest": source_digest(source_files(flex_directory, address_path)),
+        "templates": {name: template.to_snapshot() for name, template in load_templates(flex_directory).items()},
+        "gazetteer": Gazetteer.from_files(WeatherService.api_map, address_path).to_snapshot()
+    }
+    with atomic_write(path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return data
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH, flex_directory: str = FLEX_DIRECTORY, address_path: str = ADDRESS_PATH):
+    """Returns 讀取快照，不存在、版本不同或來源已變更時回傳 None
+    dict: 快照內容
+    """
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Failed to load snapshot {path}: {e}")
+        return None
+    if data.get("version") != SNAPSHOT_VERSION or data.get("digest") != source_digest(source_files(flex_directory, address_path)):
+        print(f"Snapshot {path} is outdated, run `python -m api.snapshot` to rebuild it")
+        return None
+    return data
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    build_snapshot(path)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
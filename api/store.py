@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from api.forecast import Forecast
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    city TEXT NOT NULL,
+    town TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (city, town)
+);
+CREATE TABLE IF NOT EXISTS counties (
+    city TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS astronomical (
+    county TEXT NOT NULL,
+    date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (county, date)
+);
+"""
+
+
+class ForecastStore:
+    """
+    以 SQLite(WAL)保存解析後的預報與天文時刻，同一台機器上的多個 worker/程序共用
+    讀取不會被寫入阻擋，每次寫入為單一交易(整個縣市一起替換)，新的程序可直接由快照開始
+    """
+    def __init__(self, path: str, timeout: float = 5, mmap_size: int = 64 * 1024 * 1024):
+        self.path = path
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.counts = {"hits": 0, "stale_hits": 0, "misses": 0, "writes": 0}
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def get_forecast(self, city: str, town: str):
+        """Returns 快照中的預報與到期時間，沒有資料時回傳 None
+        tuple: (Forecast, expires_at)
+        """
+        row = self._connect().execute(
+            "SELECT data, expires_at FROM forecasts WHERE city = ? AND town = ?", (city, town)
+        ).fetchone()
+        if row is None:
+            self.counts["misses"] += 1
+            return None
+        self.counts["hits" if time.time() < row[1] else "stale_hits"] += 1
+        return Forecast.from_rows(json.loads(row[0])), row[1]
+
+    def get_county(self, city: str):
+        """Returns 快照中整個縣市的預報與最後一次整個縣市寫入(replace)的到期時間
+        dict: town -> Forecast
+        float: expires_at(只有個別鄉鎮的資料或沒有資料時為 0)
+        """
+        db = self._connect()
+        rows = db.execute("SELECT town, data FROM forecasts WHERE city = ?", (city,)).fetchall()
+        county = db.execute("SELECT expires_at FROM counties WHERE city = ?", (city,)).fetchone()
+        forecasts = {town: Forecast.from_rows(json.loads(data)) for town, data in rows}
+        return forecasts, county[0] if county and forecasts else 0
+
+    def put_forecasts(self, city: str, forecasts: dict, expires_at: float, replace: bool = False):
+        """
+        寫入預報(replace 為 True 時整個縣市替換為新的資料，並記錄整個縣市的到期時間)
+        forecasts: town -> Forecast
+        """
+        now = time.time()
+        rows = [
+            (city, town, expires_at, now, json.dumps(forecast.to_rows(), ensure_ascii=False, separators=(",", ":")))
+            for town, forecast in forecasts.items() if forecast
+        ]
+        with self._transaction() as db:
+            if replace:
+                db.execute("DELETE FROM forecasts WHERE city = ?", (city,))
+                db.execute("INSERT OR REPLACE INTO counties VALUES (?, ?, ?)", (city, expires_at, now))
+            db.executemany("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?)", rows)
+        self.counts["writes"] += 1
+
+    def get_astronomical(self, date_from: str):
+        """Returns 快照中自指定日期起的天文時刻
+        dict: (county, YYYY-MM-DD) -> dict
+        """
+        rows = self._connect().execute("SELECT county, date, data FROM astronomical WHERE date >= ?", (date_from,)).fetchall()
+        return {(county, date): json.loads(data) for county, date, data in rows}
+
+    def put_astronomical(self, table: dict, date_from: str):
+        """
+        寫入天文時刻並移除指定日期之前的資料
+        table: (county, YYYY-MM-DD) -> dict
+        """
+        rows = [(county, date, json.dumps(row, ensure_ascii=False, separators=(",", ":"))) for (county, date), row in table.items()]
+        with self._transaction() as db:
+            db.execute("DELETE FROM astronomical WHERE date < ?", (date_from,))
+            db.executemany("INSERT OR REPLACE INTO astronomical VALUES (?, ?, ?)", rows)
+        self.counts["writes"] += 1
+
+    def stats(self):
+        """Returns 快照的讀寫次數與資料筆數
+        dict: 統計資料
+        """
+        db = self._connect()
+        return {
+            **self.counts,
+            "forecasts": db.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0],
+            "astronomical": db.execute("SELECT COUNT(*) FROM astronomical").fetchone()[0]
+        }
+
+    def _connect(self):
+        # 每個執行緒各自的連線；fork 後的子程序重新建立連線
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
@@ -0,0 +1,144 @@
+import operator
+
+# 建議規則表，依序為 (類別, 是否只取第一個符合的規則, [(建議, [(天氣因子, 比較, 門檻), ...]), ...])
+# 同一條規則的條件任一成立即符合，沒有條件的規則一定符合
+SUGGESTION_RULES = [
+    # 衣物建議條件
+    ("cloth", True, [
+        ("短袖", [("MaxAT", ">=", 23)]),
+        ("薄長袖", [("MaxAT", ">=", 18)]),
+        ("厚長袖", [])
+    ]),
+    ("cloth", True, [
+        ("羽絨外套", [("MinAT", "<=", 12)]),
+        ("棉外套", [("MinAT", "<=", 17)]),
+        ("薄外套", [("MinAT", "<=", 23)])
+    ]),
+    # 天氣建議條件
+    ("suggestion", False, [
+        ("注意高溫", [("MaxAT", ">=", 36)]),
+        ("注意低溫", [("MinAT", "<=", 12)]),
+        ("攜帶雨具", [("PoP12h", ">=", 30)]),
+        ("注意防曬", [("UVI", ">=", 8)]),
+        ("注意強風", [("WS", ">=", 6)])
+    ]),
+    # 運動建議條件
+    ("suggestion", True, [
+        ("避免運動", [("PoP12h", ">=", 50), ("MaxAT", ">=", 38), ("MinAT", "<=", 10)]),
+        ("減少運動", [("PoP12h", ">=", 30), ("MaxAT", ">=", 36), ("MinAT", "<=", 12), ("UVI", ">=", 10)]),
+        ("適合運動", [])
+    ]),
+    # 曬衣建議條件
+    ("suggestion", True, [
+        ("避免曬衣", [("RH", ">=", 90)]),
+        ("減少曬衣", [("RH", ">=", 80)]),
+        ("適合曬衣", [])
+    ])
+]
+
+# 規則使用的天氣因子
+SUGGESTION_FIELDS = ("MinAT", "MaxAT", "PoP12h", "WS", "UVI", "RH")
+
+OPERATORS = {">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+
+# 時段數達到此數量時才以 NumPy 批次計算(背景更新整個縣市)，單一鄉鎮的查詢(14 個時段)以純 Python 計算較快，也不需載入 NumPy
+BATCH_SIZE = 32
+
+
+class SuggestionEngine:
+    """
+    以規則表一次計算多個時段(可跨多個鄉鎮)的穿搭與天氣建議
+    """
+    def __init__(self, rules: list = SUGGESTION_RULES):
+        self.rules = rules
+        self.labels = [(category, label) for category, _, group in rules for label, _ in group]
+
+    def evaluate(self, values: dict):
+        """Returns 各時段符合的建議(以 NumPy 批次計算)
+        values: 天氣因子 -> 各時段的數值(長度相同)
+        np.ndarray: (時段數, 建議數) 的布林陣列，欄位順序與 self.labels 相同
+        """
+        import numpy as np
+        arrays = {field: np.asarray(values[field]) for field in SUGGESTION_FIELDS}
+        size = len(arrays[SUGGESTION_FIELDS[0]])
+        columns = []
+        for _, first_only, group in self.rules:
+            matched = np.zeros(size, dtype=bool)
+            for _, conditions in group:
+                mask = np.ones(size, dtype=bool) if not conditions else np.zeros(size, dtype=bool)
+                for field, op, threshold in conditions:
+                    mask |= OPERATORS[op](arrays[field], threshold)
+                if first_only:
+                    mask &= ~matched
+                    matched |= mask
+                columns.append(mask)
+        return np.column_stack(columns)
+
+    def evaluate_row(self, values: dict):
+        """Returns 單一時段符合的建議(純 Python，結果與 evaluate 的一列相同)
+        values: 天氣因子 -> 數值(None 表示缺少，該因子的條件都不成立)
+        list: 布林值，順序與 self.labels 相同
+        """
+        row = []
+        for _, first_only, group in self.rules:
+            matched = False
+            for _, conditions in group:
+                selected = not conditions
+                for field, op, threshold in conditions:
+                    value = values[field]
+                    if value is not None and OPERATORS[op](value, threshold):
+                        selected = True
+                        break
+                if first_only:
+                    selected = selected and not matched
+                    matched = matched or selected
+                row.append(selected)
+        return row
+
+    def split(self, row):
+        """Returns 將一列的結果轉為建議清單
+        list: 衣物建議
+        list: 天氣建議
+        """
+        clothes, suggestions = [], []
+        for (category, label), selected in zip(self.labels, row):
+            if selected:
+                (clothes if category == "cloth" else suggestions).append(label)
+        return clothes, suggestions
+
+    def annotate(self, forecasts):
+        """
+        一次計算多個鄉鎮所有時段的建議，存放在各 ForecastPeriod.suggestions
+        缺少天氣因子或數值無法解析(如 "-")的時段不預先計算，不影響其他時段
+        """
+        rows = [
+            (period, [parse_value(getattr(period, field)) for field in SUGGESTION_FIELDS])
+            for forecast in forecasts for period in forecast.periods
+        ]
+        rows = [(period, values) for period, values in rows if None not in values]
+        if len(rows) < BATCH_SIZE:
+            for period, values in rows:
+                period.suggestions = self.split(self.evaluate_row(dict(zip(SUGGESTION_FIELDS, values))))
+            return
+        values = {field: [row[i] for _, row in rows] for i, field in enumerate(SUGGESTION_FIELDS)}
+        for (period, _), row in zip(rows, self.evaluate(values)):
+            period.suggestions = self.split(row)
+
+    def suggest(self, period):
+        """Returns 單一時段的建議(已預先計算時直接使用)
+        list: 衣物建議
+        list: 天氣建議
+        """
+        if period.suggestions is None:
+            # 缺少或無法解析的天氣因子的條件都不成立
+            values = {field: parse_value(getattr(period, field)) for field in SUGGESTION_FIELDS}
+            period.suggestions = self.split(self.evaluate_row(values))
+        return period.suggestions
+
+
+# 將 CWA 的數值字串轉為整數(風速可能為 ">= 11" 的格式)，缺少或無法解析(如 "-")時回傳 None
+def parse_value(value: str):
+    try:
+        return int(value.split(" ")[1]) if " " in value else int(value)
+    except (TypeError, IndexError, ValueError):
+        return None
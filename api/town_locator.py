@@ -0,0 +1,121 @@
+"""
+以經緯度找出所在的縣市與鄉鎮: 使用 CWA 鄉鎮預報資料中各鄉鎮的代表點，以網格索引找出最近的鄉鎮
+代表點資料(Township.json)以下列指令由 CWA 各縣市的鄉鎮預報建立，名稱與 get_12hr_forecast 使用的完全相同
+
+CWA_API_KEY=... python -m api.town_locator [Township.json]
+"""
+import json
+import math
+import os
+import sys
+
+from api.fileutil import atomic_write
+
+TOWNSHIP_PATH = "./Township.json"
+# 經緯度換算為平面公里座標(以臺灣中部的緯度計算經度的長度)
+KM_PER_LAT = 110.57
+KM_PER_LON = 111.32 * math.cos(math.radians(23.7))
+
+
+class TownLocator:
+    """
+    以網格索引鄉鎮代表點，由座標找出最近的鄉鎮；距離所有代表點太遠(海上或國外)時回傳 None
+    """
+    def __init__(self, towns: list, cell_size: float = 10, max_distance: float = 30):
+        """
+        towns: [(city, town, 緯度, 經度)]
+        cell_size: 網格大小(公里)
+        max_distance: 視為在鄉鎮內的最遠距離(公里)
+        """
+        self.towns = [(city, town) for city, town, _, _ in towns]
+        self.points = [(lon * KM_PER_LON, lat * KM_PER_LAT) for _, _, lat, lon in towns]
+        self.cell_size = cell_size
+        self.max_distance = max_distance
+        self.grid = {}  # (col, row) -> [鄉鎮的索引]
+        for i, (x, y) in enumerate(self.points):
+            self.grid.setdefault(self._cell(x, y), []).append(i)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path: str = TOWNSHIP_PATH, **kwargs):
+        """Returns 讀取代表點資料建立索引，檔案不存在時回傳 None
+        TownLocator: 索引
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls([tuple(row) for row in data["towns"]], **kwargs)
+
+    def locate(self, latitude: float, longitude: float):
+        """Returns 座標所在的縣市與鄉鎮，距離所有鄉鎮太遠時回傳 None
+        tuple: (city, town)
+        """
+        x, y = longitude * KM_PER_LON, latitude * KM_PER_LAT
+        col, row = self._cell(x, y)
+        best, best_distance = None, self.max_distance ** 2
+        # 由所在的格子向外一圈一圈搜尋，最近的點已比下一圈更近時停止
+        rings = math.ceil(self.max_distance / self.cell_size)
+        for ring in range(rings + 1):
+            if best is not None and best_distance <= ((ring - 1) * self.cell_size) ** 2:
+                break
+            for cell in self._ring(col, row, ring):
+                for i in self.grid.get(cell, ()):
+                    px, py = self.points[i]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance <= best_distance:
+                        best, best_distance = i, distance
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.towns[best]
+
+    def stats(self):
+        """Returns 鄉鎮數與比對成功、失敗次數
+        dict: 統計資料
+        """
+        return {"towns": len(self.towns), "hits": self.hits, "misses": self.misses}
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    @staticmethod
+    def _ring(col, row, ring):
+        if ring == 0:
+            yield col, row
+            return
+        for dx in range(-ring, ring + 1):
+            yield col + dx, row - ring
+            yield col + dx, row + ring
+        for dy in range(-ring + 1, ring):
+            yield col - ring, row + dy
+            yield col + ring, row + dy
+
+
+def build_township(weather_service, path: str = TOWNSHIP_PATH):
+    """Returns 由 CWA 各縣市的鄉鎮預報取得各鄉鎮的代表點並寫入檔案
+    list: [(city, town, 緯度, 經度)]
+    """
+    from api.forecast import FORECAST_ELEMENTS
+    element = next(iter(FORECAST_ELEMENTS))
+    towns = []
+    for city, dataset in weather_service.api_map.items():
+        response = weather_service.get_weather(f"{weather_service.api_root}/{dataset}?ElementName={element}&format=JSON")
+        if not response:
+            raise RuntimeError(f"Failed to get towns of {city}")
+        for location in response.json()["records"]["Locations"][0]["Location"]:
+            towns.append((city, location["LocationName"], float(location["Latitude"]), float(location["Longitude"])))
+    with atomic_write(path, encoding="utf-8") as f:
+        json.dump({"source": "CWA F-D0047", "towns": towns}, f, ensure_ascii=False, separators=(",", ":"))
+    return towns
+
+
+if __name__ == "__main__":
+    from api.weather import WeatherService
+    path = sys.argv[1] if len(sys.argv) > 1 else TOWNSHIP_PATH
+    service = WeatherService(os.getenv("CWA_API_KEY"), api_root=os.getenv("CWA_API_ROOT", "https://opendata.cwa.gov.tw/api/v1/rest/datastore"))
+    towns = build_township(service, path)
+    print(f"Wrote {path} ({len(towns)} towns, {os.path.getsize(path)} bytes)")
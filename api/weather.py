@@ -1,9 +1,43 @@
 import requests
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
+from api.assets import AssetManifest
+from api.cache import TTLCache
+from api.http_client import HttpClient
+from api.suggestion import SuggestionEngine
+from api.forecast import Forecast, FORECAST_ELEMENTS, TAIPEI
+from api.metrics import metrics
+from api.scheduler import RequestScheduler
 
 class WeatherService:
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache_size=256, http_client=None, api_root="https://opendata.cwa.gov.tw/api/v1/rest/datastore", scheduler=None, store=None, assets=None, clock=None):
         self.api_key = api_key
+        self.api_root = api_root
+        self.http_client = http_client or HttpClient()
+        # 所有 CWA 請求共用的配額排程，429 交由排程器處理而不在連線層重試
+        self.scheduler = scheduler or RequestScheduler()
+        self.http_client.mount(api_root, "cwa", respect_retry_after_header=False)
+        # 多個程序共用的預報快照(ForecastStore)，先讀取快照再向 CWA 取得
+        self.store = store
+        # 圖示的內容雜湊檔名(AssetManifest)，沒有時使用 static 下的原始檔案
+        self.assets = assets or AssetManifest()
+        self.suggestion_engine = SuggestionEngine()
+        self.forecast_cache = TTLCache(cache_size, max_stale=__class__.max_stale)
+        # 由 ForecastPrefetcher 維護的全縣市預報: (city, town) -> Forecast
+        self.forecast_index = {}
+        # 各縣市預報的到期時間: city -> timestamp
+        self.forecast_index_expires = {}
+        # 各縣市每日的天文時刻: (city, YYYY-MM-DD) -> dict
+        self.astronomical_table = {}
+        # 已完整取得天文時刻的日期
+        self.astronomical_dates = set()
+        # 取得失敗的日期與可重試的時間: YYYY-MM-DD -> timestamp
+        self.astronomical_retry_at = {}
+        # 只保護表格的合併，對外呼叫時不持有(相同 URL 由排程器合併)
+        self.astronomical_lock = threading.Lock()
+        # 目前的臺北時間(測試時可替換)
+        self.clock = clock or (lambda: datetime.now(TAIPEI))
 
     api_map = {"宜蘭縣":"F-D0047-003","桃園市":"F-D0047-007","新竹縣":"F-D0047-011","苗栗縣":"F-D0047-015",
                 "彰化縣":"F-D0047-019","南投縣":"F-D0047-023","雲林縣":"F-D0047-027","嘉義縣":"F-D0047-031",
@@ -12,64 +46,192 @@ class WeatherService:
                 "高雄市":"F-D0047-067","新北市":"F-D0047-071","臺中市":"F-D0047-075","臺南市":"F-D0047-079",
                 "連江縣":"F-D0047-083","金門縣":"F-D0047-087"}
 
-    # 取得12小時天氣預報
+    # 鄉鎮天氣預報的發布時間(時)
+    issue_hours = (5, 11, 17, 23)
+    # 日出日落/月出月落
+    astronomical_api = ["A-B0062-001", "A-B0063-001"]
+    # 每次預先取得的天文時刻天數
+    astronomical_days = 7
+    # 建議對應的圖示
+    cloth_icons = {
+        "短袖": "short_sleeves.png",
+        "薄長袖": "thin_long_sleeves.png",
+        "厚長袖": "thick_long_sleeves.png",
+        "薄外套": "thin_jacket.png",
+        "棉外套": "cotton_jacket.png",
+        "羽絨外套": "down_jacket.png"
+    }
+    suggestion_icons = {
+        "注意高溫": "heat.png",
+        "注意低溫": "cold.png",
+        "攜帶雨具": "rain.png",
+        "注意防曬": "uv.png",
+        "注意強風": "wind.png",
+        "適合運動": "exercise_s.png",
+        "減少運動": "exercise_r.png",
+        "避免運動": "exercise_a.png",
+        "適合曬衣": "hang_s.png",
+        "減少曬衣": "hang_r.png",
+        "避免曬衣": "hang_a.png"
+    }
+    # 預報到期後仍可使用的秒數(等待背景更新或 CWA 恢復)，預先取得的預報、快取與共用快照相同
+    max_stale = 3600
+    # CWA 回應 429 且未提供 Retry-After 時暫停請求的秒數
+    quota_pause = 10
+    # 天文時刻取得失敗後，在此秒數內不重試(回傳空資料)
+    astronomical_retry = 60
+
+    # 取得12小時天氣預報(優先使用預先取得的預報，其次為快取)
+    @metrics.timed("forecast")
     def get_12hr_forecast(self, city, town):
+        forecast = self.forecast_index.get((city, town))
+        if forecast is not None and time.time() < self.forecast_index_expires.get(city, 0) + __class__.max_stale:
+            return forecast
+        # 預先取得的預報已超過 max_stale 時不再使用，與快取相同
+        # 快取的到期時間沿用載入時的到期時間(快照的預報不會因重新寫入快取而延長)
+        loaded = {}
+
+        def load():
+            forecast, loaded["expires_at"] = self.load_12hr_forecast(city, town)
+            return forecast
+
+        return self.forecast_cache.get((city, town), load, lambda forecast: loaded["expires_at"])
+
+    # 先讀取共用的快照，沒有或已過期時才向 CWA 取得並寫入快照(失敗時使用未超過 max_stale 的快照)
+    def load_12hr_forecast(self, city, town):
+        """Returns 預報與其到期時間
+        Forecast: 預報資料(取得失敗時為空的預報)
+        float: 到期時間(timestamp)，使用快照時為快照的到期時間(可能已過期，快取會在下次查詢時重新向 CWA 取得)
+        """
+        stored = self.store.get_forecast(city, town) if self.store else None
+        if stored and time.time() < stored[1]:
+            return stored
+        forecast = self.fetch_12hr_forecast(city, town)
+        if forecast:
+            expires_at = self.forecast_expires_at(forecast)
+            if self.store:
+                self.store.put_forecasts(city, {town: forecast}, expires_at)
+            return forecast, expires_at
+        if stored and time.time() < stored[1] + __class__.max_stale:
+            return stored
+        return forecast, 0
+
+    # 向CWA取得12小時天氣預報(一次取得所有天氣因子)
+    def fetch_12hr_forecast(self, city, town):
         city_id = __class__.api_map[city]
-        weather_elements = {
-            "天氣現象": "Wx",
-            "12小時降雨機率": {"name": "PoP12h", "element": "ProbabilityOfPrecipitation"},
-            "最低溫度": {"name": "MinT", "element": "MinTemperature"},
-            "最高溫度": {"name": "MaxT", "element": "MaxTemperature"},
-            "最低體感溫度": {"name": "MinAT", "element": "MinApparentTemperature"},
-            "最高體感溫度": {"name": "MaxAT", "element": "MaxApparentTemperature"},
-            "平均相對濕度": {"name": "RH", "element": "RelativeHumidity"},
-            "紫外線指數": {"name":"UVI", "element": "UVIndex"},
-            "風速": {"name": "WS", "element": "BeaufortScale"}
-        }
-        result = {}
-        for i, element in enumerate(weather_elements.keys()):
-            api_url = f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-D0047-093?locationId={city_id}&LocationName={town}&ElementName={element}&format=JSON"
-            response = self.get_weather(api_url)
-            if response:
-                data = response.json()
-                weather_data = data["records"]["Locations"][0]["Location"][0]["WeatherElement"][0]["Time"]
-                # 第一次取得資料時，取得start_time和end_time
-                if i == 0:
-                    result["start_time"] = [self.convert_time_format(weather["StartTime"]) for weather in weather_data]
-                    result["end_time"] = [self.convert_time_format(weather["StartTime"]) for weather in weather_data]
-                if element == "天氣現象":
-                    result["Wx_desc"] = [weather["ElementValue"][0]["Weather"] for weather in weather_data]
-                    result["Wx_code"] = [weather["ElementValue"][0]["WeatherCode"] for weather in weather_data]
-                else:
-                    result[weather_elements[element]["name"]] = [
-                        weather["ElementValue"][0][weather_elements[element]["element"]]
-                        for weather in weather_data
-                    ]
-            else:
-                print(f"Failed to get weather data for {city}{town}. Status code: {response.status_code}")
-        return result
+        elements = ",".join(FORECAST_ELEMENTS.keys())
+        api_url = f"{self.api_root}/F-D0047-093?locationId={city_id}&LocationName={town}&ElementName={elements}&format=JSON"
+        response = self.get_weather(api_url)
+        if response:
+            data = response.json()
+            forecast = Forecast.from_location(data["records"]["Locations"][0]["Location"][0])
+            self.suggestion_engine.annotate([forecast])
+            return forecast
+        print(f"Failed to get weather data for {city}{town}.")
+        return Forecast([])
     
-    # 取得天文時刻
-    def get_astronomical_time(self, city):
-        # 日出日落/月出月落
-        astronomical_api = ["https://opendata.cwa.gov.tw/api/v1/rest/datastore/A-B0062-001", "https://opendata.cwa.gov.tw/api/v1/rest/datastore/A-B0063-001"]
-        astronomical_data = {}
-        now = datetime.now().strftime('%Y-%m-%d')
-        for api in astronomical_api:
-            api = f"{api}?CountyName={city}&Date={now}"
-            response = self.get_weather(api)
-            if response:
-                data = response.json()
-                result = data["records"]["locations"]["location"][0]["time"][0]
-                astronomical_data.update(result)
+    # 向CWA取得整個縣市的12小時天氣預報(回傳原始回應，由呼叫端解析)
+    def fetch_county_forecast(self, city, priority=RequestScheduler.USER):
+        elements = ",".join(FORECAST_ELEMENTS.keys())
+        api_url = f"{self.api_root}/{__class__.api_map[city]}?ElementName={elements}&format=JSON"
+        response = self.get_weather(api_url, priority)
+        if not response:
+            print(f"Failed to get weather data for {city}.")
+        return response
+
+    # 預報的到期時間: 下次發布時間與下一個預報時段開始時間取較早者
+    def forecast_expires_at(self, forecast, now=None):
+        now = (now or datetime.now(TAIPEI)).replace(tzinfo=None)
+        issue_times = [now.replace(hour=hour, minute=0, second=0, microsecond=0) for hour in __class__.issue_hours]
+        issue_times.append(issue_times[0] + timedelta(days=1))
+        boundaries = [time for time in issue_times + forecast["start_time"] if time > now]
+        return min(boundaries).replace(tzinfo=TAIPEI).timestamp()
+
+    # 取得天文時刻(日出日落/月出月落)
+    @metrics.timed("astronomical")
+    def get_astronomical_time(self, city, date=None):
+        now = self.clock()
+        date = (date or now.date()).isoformat()
+        # 尚未取得的日期先讀取共用的快照，再向 CWA 取得；最近取得失敗時直接回傳空資料
+        if date not in self.astronomical_dates and now.timestamp() >= self.astronomical_retry_at.get(date, 0):
+            if not self.load_stored_astronomical(date):
+                self.load_astronomical_table(date)
+        return self.astronomical_table.get((city, date), {})
+
+    # 由快照載入自指定日期起的天文時刻，回傳該日期是否完整
+    def load_stored_astronomical(self, date_from):
+        if not self.store:
+            return False
+        stored = self.store.get_astronomical(date_from)
+        with self.astronomical_lock:
+            table = {key: dict(value) for key, value in self.astronomical_table.items() if key[1] >= date_from}
+            table.update(stored)
+            # 所有縣市都有日出日落與月出月落的日期才視為完整
+            dates = {date for _, date in stored}
+            complete = {
+                date for date in dates
+                if all({"SunRiseTime", "MoonRiseTime"} <= table.get((city, date), {}).keys() for city in __class__.api_map)
+            }
+            self.astronomical_table = table
+            self.astronomical_dates = self.astronomical_dates | complete
+        return date_from in complete
+
+    # 一次取得所有縣市自指定日期起數天的天文時刻
+    def load_astronomical_table(self, date_from, days=None):
+        """
+        date_from: 起始日期 YYYY-MM-DD
+        days: 天數(預設為 astronomical_days)
+        """
+        start = datetime.strptime(date_from, "%Y-%m-%d").date()
+        date_to = (start + timedelta(days=(days or __class__.astronomical_days) - 1)).isoformat()
+        responses = [
+            self.get_weather(f"{self.api_root}/{api}?timeFrom={date_from}&timeTo={date_to}")
+            for api in __class__.astronomical_api
+        ]
+        now = self.clock()
+        today = now.date().isoformat()
+        with self.astronomical_lock:
+            # 保留尚未過期的資料，建立新的表格後整個替換，讀取端不需要加鎖
+            table = {key: dict(value) for key, value in self.astronomical_table.items() if key[1] >= today}
+            complete = True
+            for api, response in zip(__class__.astronomical_api, responses):
+                if not response:
+                    print(f"Failed to get astronomical data from {api}.")
+                    complete = False
+                    continue
+                for location in response.json()["records"]["locations"]["location"]:
+                    for row in location["time"]:
+                        table.setdefault((location["CountyName"], row["Date"]), {}).update(row)
+            self.astronomical_table = table
+            # 兩個資料集都取得成功才視為已載入，否則在 astronomical_retry 秒後重試
+            dates = {key[1] for key in table}
+            self.astronomical_dates = (self.astronomical_dates & dates) | (dates if complete else set())
+            if complete:
+                self.astronomical_retry_at.pop(date_from, None)
             else:
-                print(f"Failed to get astronomical data. Status code: {response.status_code}")
-        return astronomical_data
-    
-    # call API取得氣象資料
-    def get_weather(self, api_url):
+                self.astronomical_retry_at[date_from] = now.timestamp() + __class__.astronomical_retry
+        if complete and self.store:
+            self.store.put_astronomical(table, today)
+
+    # call API取得氣象資料(經由排程器限制速率，相同 URL 同時間只送出一次，配額不足時回傳 None)
+    @metrics.timed("get_weather")
+    def get_weather(self, api_url, priority=RequestScheduler.USER):
+        return self.scheduler.submit(api_url, lambda: self.request_weather(api_url), priority)
+
+    def request_weather(self, api_url):
         headers = {"Authorization": self.api_key}
-        response = requests.get(api_url, headers=headers)
+        try:
+            response = self.http_client.get(api_url, headers=headers)
+        except requests.RequestException as e:
+            print(f"Failed to call CWA API: {e}")
+            metrics.count("cwa", error=True)
+            return None
+        metrics.count("cwa", error=response.status_code != 200)
+        if response.status_code == 429:
+            # 配額已用完，暫停所有 CWA 請求
+            retry_after = response.headers.get("Retry-After", "")
+            self.scheduler.pause(float(retry_after) if retry_after.isdigit() else __class__.quota_pause)
+            print("CWA API quota exceeded, pausing requests.")
         return response if response.status_code == 200 else None
     
     # 轉換時間格式 MM/DD HH:MM
@@ -107,77 +269,15 @@ class WeatherService:
     
     # 取得穿搭建議
     def get_suggestions(self, url_root, weather_data, index):
-        cloth_map = {
-            "短袖": f"{url_root}static/suggestion_icons/short_sleeves.png",
-            "薄長袖": f"{url_root}static/suggestion_icons/thin_long_sleeves.png",
-            "厚長袖": f"{url_root}static/suggestion_icons/thick_long_sleeves.png",
-            "薄外套": f"{url_root}static/suggestion_icons/thin_jacket.png",
-            "棉外套": f"{url_root}static/suggestion_icons/cotton_jacket.png",
-            "羽絨外套": f"{url_root}static/suggestion_icons/down_jacket.png"
-        }
-        suggestion_map = {
-            "注意高溫": f"{url_root}static/suggestion_icons/heat.png",
-            "注意低溫": f"{url_root}static/suggestion_icons/cold.png",
-            "攜帶雨具": f"{url_root}static/suggestion_icons/rain.png",
-            "注意防曬": f"{url_root}static/suggestion_icons/uvi.png",
-            "注意強風": f"{url_root}static/suggestion_icons/wind.png",
-            "適合運動": f"{url_root}static/suggestion_icons/exercise_s.png",
-            "減少運動": f"{url_root}static/suggestion_icons/exercise_r.png",
-            "避免運動": f"{url_root}static/suggestion_icons/exercise_a.png",
-            "適合曬衣": f"{url_root}static/suggestion_icons/hang_s.png",
-            "減少曬衣": f"{url_root}static/suggestion_icons/hang_r.png",
-            "避免曬衣": f"{url_root}static/suggestion_icons/hang_a.png"
-        }
-        minAT = int(weather_data["MinAT"][index])
-        maxAT = int(weather_data["MaxAT"][index])
-        PoP = int(weather_data["PoP12h"][index])
-        WS = int(weather_data["WS"][index].split(" ")[1]) if " " in weather_data["WS"][index] else int(weather_data["WS"][index])
-        UVI = int(weather_data["UVI"][index])
-        RH = int(weather_data["RH"][index])
-        clothes = []
-        suggestions = []
-
-        # 衣物建議條件
-        if maxAT >= 23:
-            clothes.append("短袖")
-        elif maxAT >= 18:
-            clothes.append("薄長袖")
-        else:
-            clothes.append("厚長袖")
-
-        if minAT <= 12:
-            clothes.append("羽絨外套")
-        elif minAT <= 17:
-            clothes.append("棉外套")
-        elif minAT <= 23:
-            clothes.append("薄外套")
-
-        # 天氣建議條件
-        if maxAT >= 36:
-            suggestions.append("注意高溫")
-        if minAT <= 12:
-            suggestions.append("注意低溫")
-        if PoP >= 30:
-            suggestions.append("攜帶雨具")
-        if UVI >= 8:
-            suggestions.append("注意防曬")
-        if WS >= 6:
-            suggestions.append("注意強風")
-        
-        # 運動建議條件
-        if PoP >= 50 or maxAT >= 38 or minAT <= 10:
-            suggestions.append("避免運動")
-        elif PoP >= 30 or maxAT >= 36 or minAT <= 12 or UVI >= 10:
-            suggestions.append("減少運動")
-        else:
-            suggestions.append("適合運動")
-        
-        # 曬衣建議條件
-        if RH >= 90:
-            suggestions.append("避免曬衣")
-        elif RH >= 80:
-            suggestions.append("減少曬衣")
-        else:
-            suggestions.append("適合曬衣")
+        clothes, suggestions = self.suggestion_engine.suggest(weather_data.periods[index])
+        return (
+            list(clothes),
+            [self.assets.url(url_root, f"suggestion_icons/{__class__.cloth_icons[cloth]}") for cloth in clothes],
+            list(suggestions),
+            [self.assets.url(url_root, f"suggestion_icons/{__class__.suggestion_icons[suggestion]}") for suggestion in suggestions]
+        )
 
-        return clothes, [cloth_map[cloth] for cloth in clothes], suggestions, [suggestion_map[suggestion] for suggestion in suggestions]
\ No newline at end of file
+    # 取得天氣圖示(06:00~18:00 開始的時段使用白天的圖示，其餘使用夜晚的圖示)
+    def get_weather_icon(self, url_root, wx_code, start_time):
+        variant = "day" if 6 <= start_time.hour < 18 else "night"
+        return self.assets.url(url_root, f"weather_icons/{variant}{wx_code}.jpg")
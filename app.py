@@ -1,86 +1,310 @@
 from config import Config
 from api.linebot_helper import LineBotHelper
-from flask import Flask, request, abort
-from linebot.v3.exceptions import (
-    InvalidSignatureError
-)
-from linebot.v3.webhooks import (
-    MessageEvent,
-    TextMessageContent,
-    LocationMessageContent
-)
-from linebot.v3.messaging import (
-    TextMessage,
-    FlexMessage,
-    FlexContainer
-)
+from flask import Flask, Response, request, abort, copy_current_request_context, send_from_directory
+from api.cache import TTLCache
+from api.flex_template import FlexTemplate
+from api.forecast import TAIPEI
+from api.metrics import metrics, ProfiledThreadPoolExecutor, SamplingProfiler
 from datetime import datetime, timedelta
-import pytz
-import json
+import functools
+import os
+import random
+import time
 
 app = Flask(__name__)
 
+# LINE、Azure SDK 與各 client 在第一次使用時才建立(LAZY_INIT=1)，否則在此時全部建立
 config = Config()
-configuration = config.configuration
-line_handler = config.handler
-azureService = config.azureService
-weatherService = config.weatherService
+# 同一個事件中可同時進行的外部呼叫(載入動畫、預報、天文時刻)
+fetchExecutor = ProfiledThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+# 同一個 webhook 中不同地址、地點的分析與渲染(工作中會再使用 fetchExecutor，因此分開)
+batchExecutor = ProfiledThreadPoolExecutor(max_workers=8, thread_name_prefix="batch")
+# 分析地址或取得天氣失敗的標記(該地點的事件不回覆)
+FAILED = object()
+# Flex Message 中顯示的天文時刻
+ASTRONOMICAL_TIMES = ("SunRiseTime", "SunSetTime", "MoonRiseTime", "MoonSetTime")
+# 內容雜湊檔名圖示的快取時間(一年)
+ASSET_MAX_AGE = 365 * 24 * 3600
+# 已渲染的天氣 Flex Message: (city, town, url_root, 前三個時段的預報內容, 日期, 時間區間) -> FlexTemplate
+# 渲染很快，到期的資料直接視為未命中重新渲染，不回傳舊的內容
+renderCache = TTLCache(config.RENDER_CACHE_SIZE, max_stale=0)
+
+# /metrics 一併輸出快取、連線池與事件佇列的統計(只統計已建立的物件)
+def cache_metrics():
+    caches = {"render": renderCache}
+    if config.is_loaded("weatherService"):
+        caches["forecast"] = config.weatherService.forecast_cache
+    if config.is_loaded("azureService"):
+        caches["prediction"] = config.azureService.prediction_cache
+    return [
+        ({"cache": name, "event": event}, value)
+        for name, cache in caches.items()
+        for event, value in cache.stats().items() if event not in ("size", "maxsize")
+    ]
+
+metrics.register("cache_events_total", "counter", "Cache hits, misses and evictions.", cache_metrics)
+metrics.register("http_pool_total", "counter", "Requests and connections per outbound connection pool.", lambda: [
+    ({"pool": name, "kind": kind}, value)
+    for name, stat in (config.httpClient.stats().items() if config.is_loaded("httpClient") else ())
+    for kind, value in stat.items()
+])
+metrics.register("cwa_scheduler_total", "counter", "CWA requests submitted, merged, sent, rejected and quota pauses.", lambda: [
+    ({"event": event}, value)
+    for event, value in (config.weatherService.scheduler.counts.items() if config.is_loaded("weatherService") else ())
+])
+metrics.register("webhook_queue_depth", "gauge", "Events waiting for a webhook worker.", lambda: [
+    ({}, config.eventDispatcher.queue.qsize() if config.is_loaded("eventDispatcher") else 0)
+])
+
+@functools.cache
+def get_line_handler():
+    """Returns 註冊好事件處理函式的 WebhookHandler
+    WebhookHandler: handler
+    """
+    from linebot.v3.webhooks import MessageEvent, TextMessageContent, LocationMessageContent
+    line_handler = config.handler
+    line_handler.add(event=MessageEvent, message=LocationMessageContent)(handle_location_message)
+    line_handler.add(event=MessageEvent, message=TextMessageContent)(handle_text_message)
+    return line_handler
 
 @app.route("/")
 def home():
     return "Azure Weather Bot"
 
+@app.route("/ready")
+def ready():
+    # 預先取得的預報是否已涵蓋所有縣市
+    if not config.FORECAST_PREFETCH:
+        return {"ready": True, "prefetch": False}
+    stats = config.forecastPrefetcher.stats()
+    return stats, 200 if stats["ready"] else 503
+
+@app.route("/stats")
+def stats():
+    loaded = config.is_loaded
+    return {
+        "dispatcher": config.eventDispatcher.stats() if config.ASYNC_WEBHOOK else None,
+        "forecast_cache": config.weatherService.forecast_cache.stats() if loaded("weatherService") else None,
+        "prediction_cache": config.azureService.prediction_cache.stats() if loaded("azureService") else None,
+        "render_cache": renderCache.stats(),
+        "gazetteer": config.gazetteer.stats() if loaded("gazetteer") else None,
+        "town_locator": config.townLocator.stats() if loaded("townLocator") and config.townLocator else None,
+        "http": config.httpClient.stats() if loaded("httpClient") else None,
+        "cwa_scheduler": config.weatherService.scheduler.stats() if loaded("weatherService") else None,
+        "forecast_store": config.weatherService.store.stats() if loaded("weatherService") and config.weatherService.store else None
+    }
+
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    # 檔名含內容雜湊值，內容不會改變，可永久快取(只提供對照表中的檔案)
+    if filename not in config.assets.built:
+        abort(404)
+    response = send_from_directory(os.path.join(app.static_folder, "dist"), filename, max_age=ASSET_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if not config.METRICS_ENABLED:
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/callback", methods=['POST'])
 def callback():
+    from linebot.v3.exceptions import InvalidSignatureError
+    line_handler = get_line_handler()
     # get X-Line-Signature header value
     signature = request.headers['X-Line-Signature']
     # get request body as text
     body = request.get_data(as_text=True)
-    app.logger.info("Request body: " + body)
+    if config.LOG_REQUEST_BODY:
+        app.logger.info("Request body: " + body)
 
     # parse webhook body
     try:
-        line_handler.handle(body, signature)
+        if (config.PROFILE_REQUESTS and request.args.get("profile") == "1") or random.random() < config.PROFILE_SAMPLE_RATE:
+            # 取樣分析的請求直接在 /callback 中處理，此請求提交到 fetchExecutor 與 batchExecutor 的工作也一併取樣，
+            # 使呼叫堆疊涵蓋整個流程(CWA、CLU 與 LINE 的呼叫不只顯示為等待 Future.result)
+            with SamplingProfiler() as profiler:
+                handle_webhook(line_handler, body, signature)
+            app.logger.info("Profile of /callback (collapsed stacks):\n" + profiler.collapsed())
+        elif config.ASYNC_WEBHOOK:
+            # 驗證簽章後將 webhook 交給背景執行緒，立即回應 LINE
+            eventDispatcher = config.eventDispatcher
+            if config.BATCH_EVENTS:
+                payload = line_handler.parser.parse(body, signature, as_payload=True)
+                if payload.events:
+                    eventDispatcher.submit(copy_current_request_context(handle_events), payload.events)
+            else:
+                # 逐一處理事件時由 WebhookHandler.handle 在背景執行緒中解析並呼叫註冊的處理函式
+                if not line_handler.parser.signature_validator.validate(body, signature):
+                    raise InvalidSignatureError('Invalid signature. signature=' + signature)
+                eventDispatcher.submit(copy_current_request_context(lambda webhook: line_handler.handle(*webhook)), (body, signature))
+        else:
+            handle_webhook(line_handler, body, signature)
     except InvalidSignatureError:
         abort(400)
     return 'OK'
 
 
-@line_handler.add(event=MessageEvent, message=LocationMessageContent)
+def handle_webhook(line_handler, body, signature):
+    if config.BATCH_EVENTS:
+        handle_events(line_handler.parser.parse(body, signature, as_payload=True).events)
+    else:
+        line_handler.handle(body, signature)
+
 def handle_location_message(event):
-    LineBotHelper.show_loading_animation(event)
-    address = event.message.address
-    messages = extract_address(address)
-    LineBotHelper.reply_message(event, messages)
+    message = event.message
+    reply_weather(event, message.address or "", (message.latitude, message.longitude))
 
-@line_handler.add(event=MessageEvent, message=TextMessageContent)
 def handle_text_message(event):
-    LineBotHelper.show_loading_animation(event)
     user_msg = event.message.text
-    messages = extract_address(user_msg)
+    reply_weather(event, user_msg)
+
+@metrics.timed("handle_message")
+def reply_weather(event, text, coordinates=None):
+    loading = fetchExecutor.submit(LineBotHelper.show_loading_animation, event)
+    messages = extract_address(text, coordinates)
+    loading.result()
     LineBotHelper.reply_message(event, messages)
 
-def extract_address(text):
-    result = azureService.analyze_address(text)
+@metrics.timed("handle_events")
+def handle_events(events):
+    """
+    處理同一個 webhook 中的所有事件: 相同的文字或座標只分析一次，再依地點分組，
+    每個地點只取得與渲染一次天氣資訊，不同地點同時處理，最後回覆每個 reply token
+    """
+    from linebot.v3.webhooks import MessageEvent, TextMessageContent, LocationMessageContent
+    items = []  # (event, (地址文字, 座標))
+    for event in events:
+        if isinstance(event, MessageEvent) and isinstance(event.message, TextMessageContent):
+            items.append((event, (event.message.text, None)))
+        elif isinstance(event, MessageEvent) and isinstance(event.message, LocationMessageContent):
+            message = event.message
+            items.append((event, (message.address or "", (message.latitude, message.longitude))))
+        # 其他事件(加入好友、貼圖等)沒有註冊處理函式，與 WebhookHandler.handle 相同直接略過
+    if not items:
+        return
+
+    # 每個使用者只顯示一次載入動畫
+    users = {}
+    for event, _ in items:
+        users.setdefault(event.source.user_id, event)
+    loadings = [fetchExecutor.submit(LineBotHelper.show_loading_animation, event) for event in users.values()]
+
+    texts = list(dict.fromkeys(text for _, text in items))
+    locations = dict(zip(texts, parallel_map(lambda text: resolve_location(*text), texts)))
+    places = list(dict.fromkeys(location for location in locations.values() if location is not FAILED))
+    messages = dict(zip(places, parallel_map(build_messages, places)))
+
+    for loading in loadings:
+        wait_quietly(loading)
+    replies = [
+        fetchExecutor.submit(LineBotHelper.reply_message, event, messages[locations[text]])
+        for event, text in items if messages.get(locations[text], FAILED) is not FAILED
+    ]
+    for reply in replies:
+        wait_quietly(reply)
+
+def parallel_map(func, items):
+    """Returns 同時處理多個項目(只有一個時直接處理)，失敗的項目以 FAILED 表示
+    list: 結果(順序與輸入相同)
+    """
+    def run(item):
+        try:
+            return func(item)
+        except Exception as e:
+            print(f"Failed to handle {item}: {e}")
+            return FAILED
+    if len(items) <= 1:
+        return [run(item) for item in items]
+    futures = [batchExecutor.submit(copy_current_request_context(run), item) for item in items]
+    return [future.result() for future in futures]
+
+def wait_quietly(future):
+    try:
+        future.result()
+    except Exception as e:
+        print(f"Failed to call LINE API: {e}")
+
+def resolve_location(text, coordinates=None):
+    """Returns 位置訊息的座標或地址文字中的縣市與鄉鎮，無法辨識時回傳 None
+    tuple: (city, town)
+    """
+    # 位置訊息直接以座標找出最近的鄉鎮，不需分析地址
+    if coordinates and config.townLocator:
+        with metrics.span("town_locator"):
+            location = config.townLocator.locate(*coordinates)
+        if location:
+            return location
+    # 先在本機比對縣市鄉鎮，無法明確判斷時才呼叫 Azure CLU
+    with metrics.span("gazetteer"):
+        result = config.gazetteer.match(text)
+    result = result or config.azureService.analyze_address(text)
     entities = result['prediction']['entities']
 
-    messages = []
     if len(entities) == 2 and entities[0]['category'] == 'city' and entities[1]['category'] == 'town':
         city = entities[0]['extraInformation'][0]['key'] if entities[0].get('extraInformation') else entities[0]['text']
         town = entities[1]['text']
-        messages.append(TextMessage(text=f"你傳送的位址資訊的城市:{city}"))
-        messages.append(TextMessage(text=f"你傳送的位址資訊的鄉鎮:{town}"))
-        weather_data = weatherService.get_12hr_forecast(city, town)
-        astronomical_data = weatherService.get_astronomical_time("臺北市")
-        line_flex_str = get_weather_flex(request, weather_data, astronomical_data, city, town)
-        messages.append(FlexMessage(alt_text="建議穿搭", contents=FlexContainer.from_json(line_flex_str)))
-    else:
-        messages.append(TextMessage(text="無法辨識你傳送的位址資訊"))
+        return city, town
+    return None
+
+def build_messages(location):
+    """Returns 地點的天氣回覆訊息
+    list: 訊息
+    """
+    if location is None:
+        from linebot.v3.messaging import TextMessage
+        return [TextMessage(text="無法辨識你傳送的位址資訊")]
+    city, town = location
+    # 同時取得天氣預報與天文時刻
+    weatherService = config.weatherService
+    forecast = fetchExecutor.submit(weatherService.get_12hr_forecast, city, town)
+    astronomical_data = weatherService.get_astronomical_time(city)
+    weather_data = forecast.result()
+    # 取得資料後才載入訊息類別，冷啟動時 LINE SDK 的載入可與對外呼叫同時進行
+    from linebot.v3.messaging import TextMessage, FlexMessage, FlexContainer
+    messages = [
+        TextMessage(text=f"你傳送的位址資訊的城市:{city}"),
+        TextMessage(text=f"你傳送的位址資訊的鄉鎮:{town}")
+    ]
+    if not weather_data:
+        # CWA 配額不足或失敗且沒有可用的舊資料
+        messages.append(TextMessage(text="暫時無法取得天氣資訊，請稍後再試"))
+        return messages
+    line_flex_str = get_weather_flex(request, weather_data, astronomical_data, city, town)
+    messages.append(FlexMessage(alt_text="建議穿搭", contents=FlexContainer.from_json(line_flex_str)))
     return messages
 
+def extract_address(text, coordinates=None):
+    return build_messages(resolve_location(text, coordinates))
 
+
+@metrics.timed("get_weather_flex")
 def get_weather_flex(request, weather_data, astronomical_data, city, town):
     url_root = request.url_root.replace("http://", "https://")
+    if not all(astronomical_data.get(key) for key in ASTRONOMICAL_TIMES):
+        # 無法取得天文時刻時以 --:-- 顯示，且不快取
+        astronomical_data = {key: astronomical_data.get(key) or "--:--" for key in ASTRONOMICAL_TIMES}
+        return render_weather_template(url_root, weather_data, astronomical_data, city, town).render({"sun_width": 0, "moon_width": 0})
+    # 同一地點在預報更新前的內容都相同，快取渲染結果，只在每次回覆時填入日照/月照百分比
+    bucket = int(time.time() // config.RENDER_CACHE_BUCKET)
+    # 以預報內容作為 key，同一個時段起始時間重新發布的預報不會使用舊的渲染結果
+    key = (city, town, url_root, weather_data.key(3), astronomical_data.get("Date"), bucket)
+    template = renderCache.get(
+        key,
+        lambda: render_weather_template(url_root, weather_data, astronomical_data, city, town),
+        lambda template: min(config.weatherService.forecast_expires_at(weather_data), (bucket + 1) * config.RENDER_CACHE_BUCKET)
+    )
+    sun_width, moon_width = get_astronomical_widths(astronomical_data)
+    return template.render({"sun_width": sun_width, "moon_width": moon_width})
+
+
+def render_weather_template(url_root, weather_data, astronomical_data, city, town):
+    """Returns 填入天氣資訊的 Flex Message，保留 {{sun_width}} 與 {{moon_width}} 待填入
+    FlexTemplate: 模板
+    """
+    weatherService = config.weatherService
     time_desc = weatherService.get_time_desc(weather_data["start_time"][0])
     cloth_text, cloth_icon, suggestion_text, suggestion_icon = weatherService.get_suggestions(url_root, weather_data, 0)
     if len(suggestion_text) > 3:
@@ -95,44 +319,51 @@ def get_weather_flex(request, weather_data, astronomical_data, city, town):
     cloth_amount = len(cloth_text)
     suggestion_amount = len(suggestion_text)
 
+    # 依序填入三個時段的天氣資訊(穿搭只顯示第二、三個時段)
+    period_cloth = [', '.join(weatherService.get_suggestions(url_root, weather_data, i)[0]) for i in range(1, 3)]
+    variables = {
+        "cloth_text": cloth_text,
+        "cloth_icon": cloth_icon,
+        "suggestion_text": suggestion_text,
+        "suggestion_icon": suggestion_icon,
+        "city": city,
+        "town": town,
+        "sunrise_time": astronomical_data["SunRiseTime"],
+        "sunset_time": astronomical_data["SunSetTime"],
+        "moonrise_time": astronomical_data["MoonRiseTime"],
+        "moonset_time": astronomical_data["MoonSetTime"],
+        "time_desc": time_desc[:3],
+        "minT": min_temp[:3],
+        "maxT": max_temp[:3],
+        "PoP": pop_12h[:3],
+        "Wx_url": [weatherService.get_weather_icon(url_root, code, start) for code, start in zip(wx_code[:3], weather_data["start_time"][:3])],
+        "Wx_desc": wx_desc[:3],
+        "cloth": period_cloth
+    }
+
     # 根據建議的數量，選擇Flex Message的內容
-    with open(f"./flex/suggestion_{cloth_amount}{suggestion_amount}.json", "r", encoding="utf-8") as f:
-        line_flex_json = json.load(f)
-        line_flex_str = json.dumps(line_flex_json)
-        for i in range(cloth_amount):
-            params = {
-                "cloth_text": cloth_text[i],
-                "cloth_icon": cloth_icon[i],
-            }
-            line_flex_str = LineBotHelper.replace_variable(line_flex_str, params, 1)
-        for i in range(suggestion_amount):
-            params = {
-                "suggestion_text": suggestion_text[i],
-                "suggestion_icon": suggestion_icon[i]
-            }
-            line_flex_str = LineBotHelper.replace_variable(line_flex_str, params, 1)
-
-    now = datetime.now()
-    sunrise_time = astronomical_data["SunRiseTime"]
-    sunset_time = astronomical_data["SunSetTime"]
-    moonrise_time = astronomical_data["MoonRiseTime"]
-    moonset_time = astronomical_data["MoonSetTime"]
-    sunrise_time = astronomical_data["SunRiseTime"]
+    return FlexTemplate(config.flexTemplates[f"suggestion_{cloth_amount}{suggestion_amount}"].render(variables))
+
 
+def get_astronomical_widths(astronomical_data):
+    """Returns 目前時間的日照與月照百分比
+    int: 日照百分比
+    int: 月照百分比
+    """
     # 將 HH:MM 字串轉換為 timedelta
     def time_to_timedelta(time_str):
         hours, minutes = map(int, time_str.split(":"))
         return timedelta(hours=hours, minutes=minutes)
 
     # 取得當前時間並轉換為 timedelta
-    now = datetime.now(pytz.timezone("Asia/Taipei"))
+    now = datetime.now(TAIPEI)
     current_time = timedelta(hours=now.hour, minutes=now.minute, seconds=now.second)
 
     # 將天文資料轉換為 timedelta
-    sunrise_td = time_to_timedelta(sunrise_time)
-    sunset_td = time_to_timedelta(sunset_time)
-    moonrise_td = time_to_timedelta(moonrise_time)
-    moonset_td = time_to_timedelta(moonset_time)
+    sunrise_td = time_to_timedelta(astronomical_data["SunRiseTime"])
+    sunset_td = time_to_timedelta(astronomical_data["SunSetTime"])
+    moonrise_td = time_to_timedelta(astronomical_data["MoonRiseTime"])
+    moonset_td = time_to_timedelta(astronomical_data["MoonSetTime"])
 
     if moonset_td < moonrise_td:
         moonset_td += timedelta(days=1)
@@ -148,35 +379,10 @@ def get_weather_flex(request, weather_data, astronomical_data, city, town):
         moon_width = round(((current_time - moonrise_td) / (moonset_td - moonrise_td)) * 100)
     else:
         moon_width = 100
-    params = {
-        "city": city,
-        "town": town,
-        "sunrise_time": sunrise_time,
-        "sunset_time": sunset_time,
-        "sun_width": sun_width,
-        "moon_width": moon_width,
-        "moonrise_time": moonrise_time,
-        "moonset_time": moonset_time
-    }
-    line_flex_str = LineBotHelper.replace_variable(line_flex_str, params)
-
-    # 依序替換三個時段的天氣資訊
-    for i in range(3):
-        params = {
-            "time_desc": time_desc[i],
-            "minT": min_temp[i],
-            "maxT": max_temp[i],
-            "PoP": pop_12h[i],
-            "Wx_url": f"{url_root}static/weather_icons/day{wx_code[i]}.jpg",
-            "Wx_desc": wx_desc[i],
-        }
-        if i != 0:
-            cloth_text, cloth_icon, suggestion_text, suggestion_icon = weatherService.get_suggestions(url_root, weather_data, i)
-            params["cloth"] = ', '.join(cloth_text)
-
-        line_flex_str = LineBotHelper.replace_variable(line_flex_str, params, 1).replace('\n', '')
-
-    return line_flex_str
+    return sun_width, moon_width
+
+if not config.LAZY_INIT:
+    get_line_handler()
 
 if __name__ == "__main__":
     app.run()
\ No newline at end of file
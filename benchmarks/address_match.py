@@ -0,0 +1,76 @@
+"""
+以 Address.json 比較本機地址比對與 Azure CLU 的命中率與延遲
+命中率以留一法(leave-one-out)量測: 每個地址都以不包含該地址的其餘資料建立比對器，即比對器沒看過的輸入；
+另列出以整份資料建立時的命中率(樂觀估計)作為對照。設定 AZURE_CLU_* 環境變數時才會量測 CLU
+
+python benchmarks/address_match.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api.gazetteer import Gazetteer, normalize
+from api.weather import WeatherService
+
+
+def expected(item):
+    spans = {
+        entity["category"]: normalize(item["text"][entity["offset"]:entity["offset"] + entity["length"]])
+        for entity in item["entities"]
+    }
+    return spans.get("city"), spans.get("town")
+
+
+def timed(func, text):
+    start = time.perf_counter()
+    result = func(text)
+    return result, time.perf_counter() - start
+
+
+def evaluate(name, pairs):
+    """
+    pairs: (比對器, 地址) 列出命中率與錯誤(錯誤的結果不會交給 CLU，是實際的錯誤回覆)
+    """
+    correct, wrong = 0, 0
+    for gazetteer, item in pairs:
+        result = gazetteer.match(item["text"])
+        if result:
+            city, town = [entity["text"] for entity in result["prediction"]["entities"]]
+            if (city, town) == expected(item):
+                correct += 1
+            else:
+                wrong += 1
+                print(f"  mismatch: {item['text']} -> {city} {town}")
+    print(f"{name}: local hit rate {correct + wrong}/{len(pairs)} ({(correct + wrong) / len(pairs):.1%}), "
+          f"wrong {wrong}, sent to CLU {len(pairs) - correct - wrong}")
+
+
+def main(repeat=200):
+    with open(os.path.join(ROOT, "Address.json"), "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    gazetteer = Gazetteer.from_items(WeatherService.api_map, corpus)
+
+    evaluate("held-out (leave-one-out)", [
+        (Gazetteer.from_items(WeatherService.api_map, corpus[:i] + corpus[i + 1:]), item) for i, item in enumerate(corpus)
+    ])
+    evaluate("in-sample (optimistic)", [(gazetteer, item) for item in corpus])
+
+    local_times = [min(timed(gazetteer.match, item["text"])[1] for _ in range(repeat)) for item in corpus]
+    print(f"local latency: median {statistics.median(local_times) * 1e6:.1f} us, max {max(local_times) * 1e6:.1f} us")
+
+    if os.getenv("AZURE_CLU_ENDPOINT"):
+        from api.azure import AzureService
+        azure_service = AzureService()
+        clu_times = [timed(azure_service.analyze_address, item["text"])[1] for item in corpus]
+        print(f"CLU latency: median {statistics.median(clu_times) * 1e3:.1f} ms, max {max(clu_times) * 1e3:.1f} ms")
+    else:
+        print("CLU latency: skipped (AZURE_CLU_ENDPOINT not set)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+靜態圖示測試: 比較原始圖示與 python -m api.assets 建立的圖示總大小，
+渲染各鄉鎮的天氣 Flex Message 計算每則回覆引用的圖示數與大小(原始檔案與內容雜湊檔名)，
+並檢查圖示網址的快取標頭、ETag 與重新驗證(304)
+外部服務使用 e2e.py 的本機假 CWA
+
+python -m api.assets
+python benchmarks/assets.py [--towns 40]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e import ROOT, TOWNS, FakeCLU, FakeCWA, FakeLINE, app_environ, index_corpus, load_corpus, start_server
+
+URL_ROOT = "https://bot.example.com/"
+FOLDERS = ("weather_icons", "suggestion_icons")
+
+
+def local_path(url):
+    """Returns 圖示網址對應的檔案(不是本服務的網址時回傳 None)
+    str: 檔案路徑
+    """
+    path = urlsplit(url).path
+    if path.startswith("/assets/"):
+        return os.path.join(ROOT, "static", "dist", path[len("/assets/"):])
+    if path.startswith("/static/"):
+        return os.path.join(ROOT, path.lstrip("/"))
+    return None
+
+
+def folder_size(directory):
+    files = [os.path.join(directory, name) for name in os.listdir(directory)] if os.path.isdir(directory) else []
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--towns", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    print("total asset size")
+    for folder in FOLDERS:
+        count, before = folder_size(os.path.join("static", folder))
+        built, after = folder_size(os.path.join("static", "dist", folder))
+        print(f"  {folder:<18} {count:3d} files {before / 1024:7.0f} KB -> {built:3d} files {after / 1024:7.0f} KB")
+
+    index_corpus(load_corpus())
+    servers = {
+        "cwa": start_server(FakeCWA.configure("FakeCWA", 0, 0)),
+        "clu": start_server(FakeCLU.configure("FakeCLU", 0, 0)),
+        "line": start_server(FakeLINE.configure("FakeLINE", 0, 0))
+    }
+    os.environ.update(app_environ(servers), LAZY_INIT="1")
+    import app as bot
+    from api.assets import AssetManifest
+    service = bot.config.weatherService
+    towns = random.sample(sorted((city, town) for city, names in TOWNS.items() for town in names), args.towns)
+    forecasts = [(city, town, service.get_12hr_forecast(city, town), service.get_astronomical_time(city)) for city, town in towns]
+
+    # 每則回覆引用的圖示
+    print(f"icons per reply ({len(forecasts)} towns)")
+    for name, assets in (("original files", AssetManifest()), ("content-hashed", bot.config.assets)):
+        service.assets = assets
+        icons, sizes, missing, night = [], {}, set(), 0
+        for city, town, forecast, astronomical in forecasts:
+            flex = bot.render_weather_template(URL_ROOT, forecast, astronomical, city, town).render({"sun_width": 0, "moon_width": 0})
+            urls = {url for url in re.findall(r'"url":\s*"([^"]+)"', flex) if url.startswith(URL_ROOT)}
+            night += sum("/night" in url for url in urls)
+            for url in urls:
+                path = local_path(url)
+                if os.path.exists(path):
+                    sizes[url] = os.path.getsize(path)
+                else:
+                    missing.add(url)
+            icons.append((len(urls), sum(sizes.get(url, 0) for url in urls)))
+        print(f"  {name:<15} {sum(count for count, _ in icons) / len(icons):.1f} icons/reply, "
+              f"{sum(size for _, size in icons) / len(icons) / 1024:.0f} KB/reply, "
+              f"{len(sizes)} distinct icons {sum(sizes.values()) / 1024:.0f} KB, night variants {night}, missing {len(missing)}")
+    service.assets = bot.config.assets
+
+    # 快取標頭與重新驗證
+    print("HTTP caching")
+    client = bot.app.test_client()
+    hashed = "/assets/" + next(iter(sorted(bot.config.assets.built)))
+    for url in ("/static/weather_icons/day01.jpg", hashed):
+        response = client.get(url)
+        etag = response.headers.get("ETag")
+        revalidated = client.get(url, headers={"If-None-Match": etag}) if etag else None
+        print(f"  {url:<50} {response.status_code} Cache-Control: {response.headers.get('Cache-Control')!s:<35} "
+              f"ETag: {'yes' if etag else 'no'}, If-None-Match -> {revalidated.status_code if revalidated else '-'}")
+        response.close()
+    print(f"  {'/assets/weather_icons/unknown.jpg':<50} {client.get('/assets/weather_icons/unknown.jpg').status_code}")
+
+    for server in servers.values():
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
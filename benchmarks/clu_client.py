@@ -0,0 +1,101 @@
+"""
+以本機假的 CLU 端點比較每次建立 ConversationAnalysisClient 與重複使用 client 的延遲
+(本機為 HTTP，不含 TLS 交握的成本，實際環境的差距會更大)
+
+python benchmarks/clu_client.py
+"""
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FakeCLUHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.005
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        __class__.connections += 1
+
+    def do_POST(self):
+        task = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = task["analysisInput"]["conversationItem"]["text"]
+        time.sleep(__class__.latency)
+        body = json.dumps({
+            "kind": "ConversationResult",
+            "result": {
+                "query": text,
+                "prediction": {"topIntent": "Address", "projectKind": "Conversation", "intents": [], "entities": []}
+            }
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(func, texts):
+    FakeCLUHandler.connections = 0
+    times = []
+    for text in texts:
+        start = time.perf_counter()
+        func(text)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e3, FakeCLUHandler.connections
+
+
+def main(calls=50):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCLUHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        "AZURE_CLU_API_KEY": "benchmark",
+        "AZURE_CLU_ENDPOINT": f"http://127.0.0.1:{server.server_port}",
+        "AZURE_CLU_PROJECT_NAME": "benchmark",
+        "AZURE_CLU_DEPLOYMENT_NAME": "benchmark"
+    })
+
+    from azure.ai.language.conversations import ConversationAnalysisClient
+    from api.azure import AzureService
+    azure_service = AzureService()
+    texts = [f"358苗栗縣苑裡鎮慈和街{i}號" for i in range(calls)]
+
+    def new_client(text):
+        client = ConversationAnalysisClient(azure_service.azureEndpoint, azure_service.azureKeyCredential)
+        with client:
+            client.analyze_conversation(task={
+                "kind": "Conversation",
+                "analysisInput": {"conversationItem": {"participantId": "1", "id": "1", "text": text}},
+                "parameters": {"projectName": "benchmark", "deploymentName": "benchmark"}
+            })
+
+    print(f"{'':16}{'median (ms)':>12}{'connections':>13}")
+    for name, func, inputs in [
+        ("new client", new_client, texts),
+        ("reused client", azure_service.analyze_address, texts),
+        ("cached", azure_service.analyze_address, texts)
+    ]:
+        latency, connections = measure(func, inputs)
+        print(f"{name:16}{latency:>12.2f}{connections:>13}")
+
+    start = time.perf_counter()
+    azure_service.analyze_addresses([f"{text}之1" for text in texts])
+    print(f"{calls} concurrent analyses: {(time.perf_counter() - start) * 1e3:.1f} ms ({azure_service.max_workers} workers)")
+    azure_service.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
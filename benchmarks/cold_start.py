@@ -0,0 +1,125 @@
+"""
+冷啟動效能測試: 以新的程序量測 `import app` 的時間與第一、二個 webhook 請求的延遲
+比較一般模式(LAZY_INIT=0)、延遲初始化(LAZY_INIT=1)與不使用快照的延遲初始化，並以 -X importtime 列出各套件的載入時間
+外部服務使用 e2e.py 的本機假服務
+
+python -m api.snapshot
+python benchmarks/cold_start.py [--runs 5] [--top 8]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e import ROOT, FakeCWA, FakeCLU, FakeLINE, app_environ, index_corpus, load_corpus, make_payload, start_server
+
+MODES = {
+    "eager": {"LAZY_INIT": "0"},
+    "lazy": {"LAZY_INIT": "1"},
+    "lazy (no snapshot)": {"LAZY_INIT": "1", "SNAPSHOT_PATH": ""}
+}
+MARKER = "cold-start: first request"
+
+
+def child(texts):
+    """
+    在新的程序中載入 app 並送出兩個 webhook 請求，結果以 JSON 輸出
+    """
+    start = time.perf_counter()
+    import app as bot
+    imported = time.perf_counter()
+    client = bot.app.test_client()
+
+    latency = []
+    for i, text in enumerate(texts):
+        if i == 0:
+            print(MARKER, file=sys.stderr, flush=True)
+        body, signature, _ = make_payload([text], i)
+        sent = time.perf_counter()
+        response = client.post("/callback", data=body, headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+        assert response.status_code == 200, response.status_code
+        latency.append(time.perf_counter() - sent)
+    print(json.dumps({
+        "import_ms": (imported - start) * 1e3,
+        "first_request_ms": latency[0] * 1e3,
+        "second_request_ms": latency[1] * 1e3
+    }))
+
+
+def parse_importtime(stderr):
+    """Returns 依最上層套件加總 import 時間(self)，以 MARKER 分為 import app 與第一個請求兩段
+    list: [{套件: 毫秒}, {套件: 毫秒}]
+    """
+    phases = [{}, {}]
+    phase = 0
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            phase = 1
+        elif line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            self_us, _, name = (field.strip() for field in line[len("import time:"):].split("|"))
+            package = name.split(".")[0]
+            package = "app" if package in ("app", "config", "api") else package
+            phases[phase][package] = phases[phase].get(package, 0) + int(self_us) / 1e3
+    return phases
+
+
+def run(env, texts, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + [__file__, "--child", json.dumps(texts, ensure_ascii=False)]
+    result = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--cwa-latency", type=float, default=50, help="ms")
+    parser.add_argument("--clu-latency", type=float, default=80, help="ms")
+    parser.add_argument("--line-latency", type=float, default=30, help="ms")
+    parser.add_argument("--child")
+    args = parser.parse_args()
+    if args.child:
+        child(json.loads(args.child))
+        return
+
+    corpus = load_corpus()
+    index_corpus(corpus)
+    servers = {
+        "cwa": start_server(FakeCWA.configure("FakeCWA", args.cwa_latency / 1000, 0)),
+        "clu": start_server(FakeCLU.configure("FakeCLU", args.clu_latency / 1000, 0)),
+        "line": start_server(FakeLINE.configure("FakeLINE", args.line_latency / 1000, 0))
+    }
+    if not os.path.exists(os.path.join(ROOT, "snapshot.pickle")):
+        print("snapshot.pickle not found, run `python -m api.snapshot` first")
+
+    # 每次使用不同的地址，避免前一個程序的結果影響
+    texts = [item["text"] for item in corpus]
+    print(f"{'mode':<20} {'import app':>12} {'1st request':>12} {'2nd request':>12} {'import + 1st':>13}  (median of {args.runs} runs, ms)")
+    breakdowns = {}
+    for mode, mode_env in MODES.items():
+        env = {**os.environ, **app_environ(servers), **mode_env}
+        results = [run(env, texts[i * 2 % len(texts):i * 2 % len(texts) + 2])[0] for i in range(args.runs)]
+        median = {key: statistics.median(result[key] for result in results) for key in results[0]}
+        print(f"{mode:<20} {median['import_ms']:>12.1f} {median['first_request_ms']:>12.1f} {median['second_request_ms']:>12.1f} "
+              f"{median['import_ms'] + median['first_request_ms']:>13.1f}")
+        breakdowns[mode] = parse_importtime(run(env, texts[:2], importtime=True)[1])
+
+    for mode, phases in breakdowns.items():
+        print(f"\nimport time by package, {mode} (self time, ms)")
+        for title, packages in zip(("import app", "first request"), phases):
+            top = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+            print(f"  {title:<14} total {sum(packages.values()):7.1f}: " + ", ".join(f"{name} {ms:.1f}" for name, ms in top))
+
+    for server in servers.values():
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
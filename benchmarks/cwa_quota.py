@@ -0,0 +1,141 @@
+"""
+以本機限制配額的假 CWA 服務(超過配額回應 429)測試 RequestScheduler:
+使用者查詢的突發流量與背景更新全縣市預報同時進行，比較不限制速率與依配額排程時的 429 次數、成功率與延遲
+
+python benchmarks/cwa_quota.py [--users 300] [--concurrency 16] [--quota 10]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e import ROOT, TOWNS, FakeCWA, index_corpus, load_corpus, percentile, start_server
+
+
+class QuotaCWA(FakeCWA):
+    """
+    以 token bucket 限制每秒請求數的假 CWA，超過配額回應 429
+    """
+    quota = 10.0
+    tokens = 10.0
+    updated = 0.0
+    rejected = 0
+
+    def reply(self, body):
+        with self.lock:
+            now = time.monotonic()
+            cls = type(self)
+            cls.tokens = min(cls.quota, cls.tokens + (now - cls.updated) * cls.quota)
+            cls.updated = now
+            allowed = cls.tokens >= 1
+            if allowed:
+                cls.tokens -= 1
+            else:
+                cls.rejected += 1
+        if allowed:
+            return super().reply(body)
+        data = b'{"message": "quota exceeded"}'
+        self.send_response(429)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def run(name, scheduler, args, queries):
+    from api.weather import WeatherService
+    from api.prefetcher import ForecastPrefetcher
+    handler = QuotaCWA.configure("QuotaCWA", args.latency / 1000, 0)
+    handler.quota, handler.tokens, handler.updated, handler.rejected = args.quota, args.quota, time.monotonic(), 0
+    server = start_server(handler)
+    service = WeatherService("benchmark", api_root=f"http://127.0.0.1:{server.server_port}/api/v1/rest/datastore", scheduler=scheduler)
+    prefetcher = ForecastPrefetcher(service)
+
+    def query(item):
+        city, town = item
+        start = time.perf_counter()
+        forecast = service.get_12hr_forecast(city, town)
+        astronomical = service.get_astronomical_time(city)
+        return time.perf_counter() - start, bool(forecast), bool(astronomical)
+
+    # 背景更新與使用者查詢同時開始
+    background = threading.Thread(target=prefetcher.refresh_all)
+    started = time.perf_counter()
+    background.start()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(query, queries))
+    user_time = time.perf_counter() - started
+    background.join()
+    total_time = time.perf_counter() - started
+    server.shutdown()
+
+    latency = [result[0] * 1e3 for result in results]
+    stats = scheduler.stats()
+    print(f"{name}")
+    print(f"  CWA calls {handler.calls}, 429 responses {handler.rejected}")
+    print(f"  user queries {len(results)} in {user_time:.2f} s: forecast ok {sum(r[1] for r in results)}, "
+          f"astronomical ok {sum(r[2] for r in results)}, latency p50 {percentile(latency, 50):.1f} ms, "
+          f"p95 {percentile(latency, 95):.1f} ms, max {max(latency):.1f} ms")
+    print(f"  background refresh: {len(prefetcher.updated_at)}/{len(prefetcher.cities)} counties in {total_time:.2f} s")
+    print(f"  scheduler: submitted {stats['submitted']}, merged {stats['merged']}, sent {stats['sent']}, "
+          f"rejected {stats['rejected']}, pauses {stats['paused']}, "
+          f"wait avg user {stats['wait']['user']['avg'] * 1e3:.1f} ms / background {stats['wait']['background']['avg'] * 1e3:.1f} ms")
+
+
+def single_flight(args, requests=20):
+    """
+    同時送出相同 URL 的請求，應只呼叫 CWA 一次
+    """
+    from api.scheduler import RequestScheduler
+    from api.weather import WeatherService
+    handler = QuotaCWA.configure("QuotaCWA", args.latency / 1000, 0)
+    handler.quota, handler.tokens, handler.updated, handler.rejected = args.quota, args.quota, time.monotonic(), 0
+    server = start_server(handler)
+    service = WeatherService("benchmark", api_root=f"http://127.0.0.1:{server.server_port}/api/v1/rest/datastore", scheduler=RequestScheduler())
+    url = f"{service.api_root}/A-B0062-001?timeFrom=2025-01-01&timeTo=2025-01-07"
+    barrier = threading.Barrier(requests)
+
+    def call(_):
+        barrier.wait()
+        return service.get_weather(url)
+
+    with ThreadPoolExecutor(max_workers=requests) as executor:
+        responses = list(executor.map(call, range(requests)))
+    server.shutdown()
+    print(f"single-flight: {requests} concurrent identical requests -> {handler.calls} CWA call(s), "
+          f"{sum(1 for response in responses if response is not None)} responses")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--towns", type=int, default=40, help="使用者查詢的不同鄉鎮數")
+    parser.add_argument("--quota", type=float, default=10, help="假 CWA 每秒可接受的請求數")
+    parser.add_argument("--latency", type=float, default=50, help="ms")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from api.scheduler import RequestScheduler
+
+    index_corpus(load_corpus())
+    towns = random.sample(sorted((city, town) for city, names in TOWNS.items() for town in names), args.towns)
+    queries = [random.choice(towns) for _ in range(args.users)]
+
+    single_flight(args)
+    run("no rate limit (pause on 429 only)", RequestScheduler(rate=0), args, queries)
+    # 留一些餘裕，避免與服務端的計時差異造成 429
+    rate = args.quota * 0.9
+    run(f"scheduler {rate:g}/s", RequestScheduler(rate=rate, burst=int(rate)), args, queries)
+
+
+if __name__ == "__main__":
+    main()
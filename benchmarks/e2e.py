@@ -0,0 +1,337 @@
+"""
+端對端效能測試: 在本機啟動假的 CWA、Azure CLU 與 LINE 服務，以指定的並行數送出簽章過的 webhook 至 /callback
+結果(延遲百分位數、每秒請求數、每則訊息的對外呼叫次數)以 JSON 輸出
+
+python benchmarks/e2e.py --requests 200 --concurrency 8 [--async] [--events 1] [--distinct N] [--no-batch] [--output result.json]
+"""
+import argparse
+import base64
+import contextlib
+import copy
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHANNEL_SECRET = "benchmark"
+
+
+def load_corpus():
+    with open(os.path.join(ROOT, "Address.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def normalize(text):
+    return text.replace("台", "臺")
+
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    """
+    假的外部服務，可設定延遲與錯誤率，並記錄呼叫與連線次數
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    error_rate = 0.0
+
+    @classmethod
+    def configure(cls, name, latency, error_rate):
+        return type(name, (cls,), {
+            "latency": latency,
+            "error_rate": error_rate,
+            "calls": 0,
+            "errors": 0,
+            "connections": 0,
+            "lock": threading.Lock()
+        })
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            type(self).connections += 1
+
+    def do_GET(self):
+        self.reply(None)
+
+    def do_POST(self):
+        self.reply(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}"))
+
+    def reply(self, body):
+        with self.lock:
+            type(self).calls += 1
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            with self.lock:
+                type(self).errors += 1
+            status, data = 500, b'{"message": "injected error"}'
+        else:
+            url = urlsplit(self.path)
+            status, data = self.respond(url.path, {key: values[0] for key, values in parse_qs(url.query).items()}, body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def respond(self, path, query, body):
+        raise NotImplementedError
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeCWA(FakeUpstream):
+    responses = {}
+
+    def respond(self, path, query, body):
+        key = (path, tuple(sorted(query.items())))
+        if key not in self.responses:
+            self.responses[key] = json.dumps(self.build(path.rsplit("/", 1)[-1], query), ensure_ascii=False).encode()
+        return 200, self.responses[key]
+
+    def build(self, dataset, query):
+        from api.weather import WeatherService
+        if dataset in ("A-B0062-001", "A-B0063-001"):
+            start, end = date.fromisoformat(query["timeFrom"]), date.fromisoformat(query["timeTo"])
+            days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+            row = {"SunRiseTime": "06:05", "SunSetTime": "17:25"} if dataset == "A-B0062-001" else {"MoonRiseTime": "14:10", "MoonSetTime": "01:30"}
+            return {"records": {"locations": {"location": [
+                {"CountyName": city, "time": [{"Date": day, **row} for day in days]} for city in WeatherService.api_map
+            ]}}}
+
+        # 合成的 CWA 格式資料(非錄製的回應，見 forecast_fetch.py)
+        with open(os.path.join(ROOT, "benchmarks", "fixtures", "F-D0047-093_F-D0047-015.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        template = data["records"]["Locations"][0]["Location"][0]
+        elements = query.get("ElementName")
+        if elements:
+            template["WeatherElement"] = [element for element in template["WeatherElement"] if element["ElementName"] in elements.split(",")]
+        if dataset == "F-D0047-093":
+            city = next(city for city, city_id in WeatherService.api_map.items() if city_id == query["locationId"])
+            towns = [query["LocationName"]]
+        else:
+            city = next(city for city, city_id in WeatherService.api_map.items() if city_id == dataset)
+            towns = sorted(TOWNS.get(city, set())) or [template["LocationName"]]
+        data["records"]["Locations"][0]["LocationsName"] = city
+        data["records"]["Locations"][0]["Location"] = [
+            dict(copy.deepcopy(template), LocationName=town, **fake_coordinates(city, town)) for town in towns
+        ]
+        return data
+
+
+def fake_coordinates(city, town):
+    """Returns 假的鄉鎮代表點(依名稱固定，分布於臺灣本島的範圍內)
+    dict: Latitude, Longitude
+    """
+    digest = hashlib.sha1(f"{city}{town}".encode()).digest()
+    latitude = 22.0 + int.from_bytes(digest[:4], "big") / 2 ** 32 * 3.2
+    longitude = 120.1 + int.from_bytes(digest[4:8], "big") / 2 ** 32 * 1.8
+    return {"Latitude": f"{latitude:.3f}", "Longitude": f"{longitude:.3f}"}
+
+
+class FakeCLU(FakeUpstream):
+    def respond(self, path, query, body):
+        text = body["analysisInput"]["conversationItem"]["text"]
+        entities = []
+        for entity in LABELS.get(text, []):
+            span = text[entity["offset"]:entity["offset"] + entity["length"]]
+            item = {"category": entity["category"], "text": span, "offset": entity["offset"], "length": entity["length"], "confidenceScore": 1}
+            if entity["category"] == "city":
+                item["extraInformation"] = [{"extraInformationKind": "ListKey", "key": normalize(span)}]
+            entities.append(item)
+        entities.sort(key=lambda entity: entity["category"] != "city")
+        return 200, json.dumps({"kind": "ConversationResult", "result": {
+            "query": text,
+            "prediction": {"topIntent": "Address", "projectKind": "Conversation", "intents": [], "entities": entities}
+        }}).encode()
+
+
+class FakeLINE(FakeUpstream):
+    replied_at = {}
+
+    def respond(self, path, query, body):
+        if path.endswith("/message/reply"):
+            self.replied_at[body["replyToken"]] = time.perf_counter()
+            return 200, b'{"sentMessages": [{"id": "1", "quoteToken": "q"}]}'
+        return 202, b"{}"
+
+
+LABELS = {}
+TOWNS = {}
+
+
+def index_corpus(corpus):
+    """
+    由 Address.json 建立假 CLU 的標註與假 CWA 各縣市的鄉鎮
+    """
+    for item in corpus:
+        LABELS[item["text"]] = item["entities"]
+        spans = {entity["category"]: normalize(item["text"][entity["offset"]:entity["offset"] + entity["length"]]) for entity in item["entities"]}
+        if "city" in spans and "town" in spans:
+            TOWNS.setdefault(spans["city"], set()).add(spans["town"])
+
+
+def start_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def app_environ(servers, async_webhook=False):
+    """
+    將應用程式的外部服務指向本機的假服務
+    """
+    return {
+        "CHANNEL_SECRET": CHANNEL_SECRET,
+        "CHANNEL_ACCESS_TOKEN": "benchmark",
+        "CWA_API_KEY": "benchmark",
+        "CWA_API_ROOT": f"http://127.0.0.1:{servers['cwa'].server_port}/api/v1/rest/datastore",
+        "LINE_API_HOST": f"http://127.0.0.1:{servers['line'].server_port}",
+        "AZURE_CLU_API_KEY": "benchmark",
+        "AZURE_CLU_ENDPOINT": f"http://127.0.0.1:{servers['clu'].server_port}",
+        "AZURE_CLU_PROJECT_NAME": "benchmark",
+        "AZURE_CLU_DEPLOYMENT_NAME": "benchmark",
+        "ASYNC_WEBHOOK": "1" if async_webhook else "0"
+    }
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else (values[0] if values else 0)
+
+
+def make_payload(texts, request_id):
+    events = [{
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "webhookEventId": f"{request_id}-{i}",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"{request_id}-{i}",
+        "source": {"type": "user", "userId": f"U{request_id % 50:032d}"},
+        "message": {"type": "text", "id": f"{request_id}-{i}", "quoteToken": "q", "text": text}
+    } for i, text in enumerate(texts)]
+    body = json.dumps({"destination": "benchmark", "events": events}, ensure_ascii=False)
+    signature = base64.b64encode(hmac.new(CHANNEL_SECRET.encode(), body.encode(), hashlib.sha256).digest()).decode()
+    return body.encode(), signature, [event["replyToken"] for event in events]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--events", type=int, default=1, help="每個 webhook 中的事件數")
+    parser.add_argument("--distinct", type=int, help="每個 webhook 中不同地址的數量(預設與事件數相同)，模擬群組中多人查詢同一地點")
+    parser.add_argument("--no-batch", dest="batch_events", action="store_false", help="停用 BATCH_EVENTS，逐一處理事件")
+    parser.add_argument("--async", dest="async_webhook", action="store_true", help="啟用 ASYNC_WEBHOOK")
+    parser.add_argument("--cwa-latency", type=float, default=50, help="ms")
+    parser.add_argument("--clu-latency", type=float, default=80, help="ms")
+    parser.add_argument("--line-latency", type=float, default=30, help="ms")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    corpus = load_corpus()
+    index_corpus(corpus)
+
+    upstreams = {
+        "cwa": FakeCWA.configure("FakeCWA", args.cwa_latency / 1000, args.error_rate),
+        "clu": FakeCLU.configure("FakeCLU", args.clu_latency / 1000, args.error_rate),
+        "line": FakeLINE.configure("FakeLINE", args.line_latency / 1000, args.error_rate)
+    }
+    servers = {name: start_server(handler) for name, handler in upstreams.items()}
+    os.environ.update(app_environ(servers, args.async_webhook))
+    os.environ["BATCH_EVENTS"] = "1" if args.batch_events else "0"
+    os.chdir(ROOT)
+
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+    import app as bot
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app_server = make_server("127.0.0.1", 0, bot.app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    callback_url = f"http://127.0.0.1:{app_server.server_port}/callback"
+
+    texts = [item["text"] for item in corpus]
+    distinct = min(args.distinct or args.events, args.events)
+
+    def sample_texts():
+        chosen = random.sample(texts, distinct)
+        return chosen + [random.choice(chosen) for _ in range(args.events - distinct)]
+
+    payloads = [make_payload(sample_texts(), i) for i in range(args.requests)]
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def send(payload):
+        body, signature, tokens = payload
+        start = time.perf_counter()
+        response = session.post(callback_url, data=body, headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+        return start, time.perf_counter(), response.status_code, tokens
+
+    # 應用程式的輸出改到 stderr，stdout 只輸出 JSON 結果
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(send, payloads))
+        # 非同步模式下等待佇列中的事件處理完畢
+        if args.async_webhook:
+            bot.config.eventDispatcher.queue.join()
+    tokens = [token for result in results for token in result[3]]
+    finished = max([FakeLINE.replied_at.get(token, 0) for token in tokens] + [result[1] for result in results])
+
+    ack_latency = [(end - start) * 1e3 for start, end, _, _ in results]
+    reply_latency = [
+        (max(FakeLINE.replied_at[token] for token in result[3]) - result[0]) * 1e3
+        for result in results if all(token in FakeLINE.replied_at for token in result[3])
+    ]
+    messages = len(tokens)
+    report = {
+        "config": vars(args),
+        "requests": args.requests,
+        "messages": messages,
+        "duration_s": round(finished - started, 3),
+        "requests_per_s": round(args.requests / (finished - started), 2),
+        "messages_per_s": round(messages / (finished - started), 2),
+        "status": {str(code): sum(1 for result in results if result[2] == code) for code in {result[2] for result in results}},
+        "replied": sum(1 for token in tokens if token in FakeLINE.replied_at),
+        "ack_latency_ms": {f"p{q}": round(percentile(ack_latency, q), 2) for q in (50, 95, 99)},
+        "reply_latency_ms": {f"p{q}": round(percentile(reply_latency, q), 2) for q in (50, 95, 99)},
+        "upstream": {
+            name: {
+                "calls": handler.calls,
+                "errors": handler.errors,
+                "connections": handler.connections,
+                "calls_per_message": round(handler.calls / messages, 3)
+            }
+            for name, handler in upstreams.items()
+        },
+        # 應用程式記錄的各階段平均耗時
+        "stage_avg_ms": {stage: round(stat[-2] / stat[-1] * 1e3, 2) for stage, stat in sorted(bot.metrics.stages.items())}
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    app_server.shutdown()
+    for server in servers.values():
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
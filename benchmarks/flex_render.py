@@ -0,0 +1,75 @@
+"""
+比較預先編譯的 FlexTemplate 與原本逐次 re.sub 的 replace_variable 的渲染時間與記憶體配置
+(隨機輸入下兩者結果相同的測試在 tests/test_flex_render.py)
+
+python benchmarks/flex_render.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api.flex_template import FlexTemplate
+from tests.test_flex_render import legacy_render
+
+URL_ROOT = "https://example.com/"
+SUGGESTION_ICONS = f"{URL_ROOT}static/suggestion_icons/"
+
+
+def compiled_render(template, inputs):
+    variables = {key: value for key, value in inputs.items() if key != "common"}
+    variables.update(inputs["common"])
+    return template.render(variables)
+
+
+def sample_inputs(cloth_amount, suggestion_amount):
+    clothes = ["短袖", "薄外套"][:cloth_amount]
+    suggestions = ["攜帶雨具", "減少運動", "適合曬衣"][:suggestion_amount]
+    return {
+        "cloth_text": clothes,
+        "cloth_icon": [f"{SUGGESTION_ICONS}{name}.png" for name in ("short_sleeves", "thin_jacket")][:cloth_amount],
+        "suggestion_text": suggestions,
+        "suggestion_icon": [f"{SUGGESTION_ICONS}{name}.png" for name in ("rain", "exercise_r", "hang_s")][:suggestion_amount],
+        "common": {
+            "city": "苗栗縣", "town": "苑裡鎮",
+            "sunrise_time": "06:31", "sunset_time": "17:12", "sun_width": 42,
+            "moonrise_time": "13:05", "moonset_time": "00:58", "moon_width": 100
+        },
+        "time_desc": ["今晚明晨", "明日白天", "明日晚上"],
+        "minT": ["14", "15", "13"],
+        "maxT": ["18", "22", "17"],
+        "PoP": ["30", "10", "20"],
+        "Wx_url": [f"{URL_ROOT}static/weather_icons/day{code}.jpg" for code in ("08", "04", "06")],
+        "Wx_desc": ["多雲短暫雨", "多雲", "陰時多雲"],
+        "cloth": ["薄長袖, 棉外套", "短袖, 薄外套"]
+    }
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(number=500):
+    print(f"{'template':16}{'legacy (us)':>12}{'compiled (us)':>15}{'legacy peak (B)':>17}{'compiled peak (B)':>19}")
+    for cloth_amount, suggestion_amount in ((1, 2), (1, 3), (2, 2), (2, 3)):
+        path = os.path.join(ROOT, "flex", f"suggestion_{cloth_amount}{suggestion_amount}.json")
+        template = FlexTemplate.load(path)
+        inputs = sample_inputs(cloth_amount, suggestion_amount)
+        assert legacy_render(path, inputs) == compiled_render(template, inputs)
+
+        legacy_time = timeit.timeit(lambda: legacy_render(path, inputs), number=number) / number
+        compiled_time = timeit.timeit(lambda: compiled_render(template, inputs), number=number) / number
+        legacy_peak = peak_memory(lambda: legacy_render(path, inputs))
+        compiled_peak = peak_memory(lambda: compiled_render(template, inputs))
+        print(f"{os.path.basename(path):16}{legacy_time * 1e6:>12.1f}{compiled_time * 1e6:>15.1f}{legacy_peak:>17}{compiled_peak:>19}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+重播 CWA F-D0047-093 格式的回應，比較逐一取得天氣因子與一次取得的請求次數與解析時間
+fixtures/F-D0047-093_F-D0047-015.json 是依 CWA 回應格式手動建立的合成資料(數值非實際觀測，例如 BeaufortScale 皆為 "4")，
+不是錄製的 CWA 回應；只用於比較請求次數與解析時間，不代表實際資料的分布
+
+python benchmarks/forecast_fetch.py
+"""
+import json
+import os
+import sys
+import timeit
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api.forecast import Forecast, FORECAST_ELEMENTS
+from api.weather import WeatherService
+
+FIXTURE_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+CITY, TOWN = "苗栗縣", "苑裡鎮"
+
+
+class ReplayResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class ReplayWeatherService(WeatherService):
+    """
+    以錄製好的回應取代 CWA API，並記錄請求次數
+    """
+    def __init__(self):
+        super().__init__("replay")
+        self.request_count = 0
+
+    def get_weather(self, api_url):
+        self.request_count += 1
+        query = parse_qs(urlsplit(api_url).query)
+        return ReplayResponse(replay(query["locationId"][0], query["ElementName"][0].split(",")))
+
+
+def load_fixture(city_id):
+    with open(os.path.join(FIXTURE_DIR, f"F-D0047-093_{city_id}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def replay(city_id, element_names):
+    data = load_fixture(city_id)
+    location = data["records"]["Locations"][0]["Location"][0]
+    location["WeatherElement"] = [
+        element for element in location["WeatherElement"] if element["ElementName"] in element_names
+    ]
+    return data
+
+
+def legacy_parse(responses):
+    """
+    原本逐一呼叫各天氣因子後，組成 dict of list 的解析方式
+    """
+    result = {}
+    for i, (element, data) in enumerate(responses):
+        weather_data = data["records"]["Locations"][0]["Location"][0]["WeatherElement"][0]["Time"]
+        if i == 0:
+            result["start_time"] = [WeatherService.convert_time_format(None, weather["StartTime"]) for weather in weather_data]
+        for field, key in FORECAST_ELEMENTS[element].items():
+            result[field] = [weather["ElementValue"][0][key] for weather in weather_data]
+    return result
+
+
+def legacy_12hr_forecast(service, city, town):
+    city_id = WeatherService.api_map[city]
+    responses = []
+    for element in FORECAST_ELEMENTS:
+        api_url = f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-D0047-093?locationId={city_id}&LocationName={town}&ElementName={element}&format=JSON"
+        responses.append((element, service.get_weather(api_url).json()))
+    return legacy_parse(responses)
+
+
+def main(number=2000):
+    city_id = WeatherService.api_map[CITY]
+
+    legacy_service = ReplayWeatherService()
+    legacy = legacy_12hr_forecast(legacy_service, CITY, TOWN)
+    batch_service = ReplayWeatherService()
+    batch = batch_service.get_12hr_forecast(CITY, TOWN)
+
+    # 紫外線指數只有白天時段，比較共同的部分
+    for field, values in legacy.items():
+        assert batch[field][:len(values)] == values, field
+
+    legacy_responses = [(element, replay(city_id, [element])) for element in FORECAST_ELEMENTS]
+    batch_response = replay(city_id, list(FORECAST_ELEMENTS))
+    location = batch_response["records"]["Locations"][0]["Location"][0]
+    legacy_time = timeit.timeit(lambda: legacy_parse(legacy_responses), number=number) / number
+    batch_time = timeit.timeit(lambda: Forecast.from_location(location), number=number) / number
+
+    print(f"{'':10}{'requests':>10}{'parse (us)':>14}")
+    print(f"{'legacy':10}{legacy_service.request_count:>10}{legacy_time * 1e6:>14.1f}")
+    print(f"{'batch':10}{batch_service.request_count:>10}{batch_time * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
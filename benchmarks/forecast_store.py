@@ -0,0 +1,159 @@
+"""
+共用預報快照(ForecastStore)測試: 以背景更新寫入全縣市預報後，量測快照的讀取延遲與整個縣市替換的時間，
+並以新的 WeatherService(模擬新啟動的 worker)指向同一個快照，比較有無快照時第一批查詢的 CWA 呼叫次數與延遲，
+以及另一個 worker 背景更新時的 CWA 呼叫次數，最後在另一個程序持續讀取的同時替換縣市資料，確認讀取不會被寫入阻擋
+外部服務使用 e2e.py 的本機假 CWA
+
+python benchmarks/forecast_store.py [--lookups 5000] [--queries 200] [--latency 50]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e import ROOT, TOWNS, FakeCWA, index_corpus, load_corpus, percentile, start_server
+
+
+def timed(func, items):
+    latency = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latency.append((time.perf_counter() - start) * 1e6)
+    return latency
+
+
+def summary(latency):
+    return f"p50 {percentile(latency, 50):7.1f} us, p99 {percentile(latency, 99):7.1f} us"
+
+
+def new_service(port, store):
+    from api.scheduler import RequestScheduler
+    from api.weather import WeatherService
+    return WeatherService("benchmark", api_root=f"http://127.0.0.1:{port}/api/v1/rest/datastore",
+                          scheduler=RequestScheduler(rate=0), store=store)
+
+
+def first_queries(name, handler, port, store, queries):
+    """
+    新啟動的服務處理第一批查詢時的 CWA 呼叫次數與延遲
+    """
+    service = new_service(port, store)
+    calls = handler.calls
+    latency = timed(lambda item: (service.get_12hr_forecast(*item), service.get_astronomical_time(item[0])), queries)
+    print(f"  {name:<24} CWA calls {handler.calls - calls:4d}, "
+          f"p50 {percentile(latency, 50) / 1e3:7.2f} ms, p99 {percentile(latency, 99) / 1e3:7.2f} ms, "
+          f"total {sum(latency) / 1e6:6.2f} s")
+
+
+def reader(path, towns, seconds, result):
+    """
+    在另一個程序中持續讀取，記錄延遲與錯誤
+    """
+    from api.store import ForecastStore
+    store = ForecastStore(path)
+    latency, errors, found = [], 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        city, town = random.choice(towns)
+        start = time.perf_counter()
+        try:
+            found += store.get_forecast(city, town) is not None
+        except Exception:
+            errors += 1
+        latency.append((time.perf_counter() - start) * 1e6)
+    result.put((len(latency), errors, found, percentile(latency, 50), percentile(latency, 99), max(latency)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=50, help="ms")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from datetime import datetime
+    from api.forecast import TAIPEI
+    from api.prefetcher import ForecastPrefetcher
+    from api.store import ForecastStore
+
+    index_corpus(load_corpus())
+    towns = sorted((city, town) for city, names in TOWNS.items() for town in names)
+    handler = FakeCWA.configure("FakeCWA", args.latency / 1000, 0)
+    server = start_server(handler)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "forecast.sqlite3")
+    store = ForecastStore(path)
+
+    # 以背景更新寫入全縣市預報與天文時刻
+    service = new_service(server.server_port, store)
+    prefetcher = ForecastPrefetcher(service)
+    start = time.perf_counter()
+    prefetcher.refresh_all()
+    service.get_astronomical_time("臺北市")
+    stats = store.stats()
+    print(f"populate: {stats['forecasts']} towns, {stats['astronomical']} astronomical rows in {time.perf_counter() - start:.2f} s, "
+          f"{os.path.getsize(path) / 1024:.0f} KB")
+
+    # 讀取與寫入延遲
+    print("lookup latency")
+    lookups = [random.choice(towns) for _ in range(args.lookups)]
+    print(f"  get_forecast             {summary(timed(lambda item: store.get_forecast(*item), lookups))}")
+    print(f"  forecast_index (memory)  {summary(timed(lambda item: service.forecast_index.get(item), lookups))}")
+    cities = [random.choice(prefetcher.cities) for _ in range(args.lookups // 50)]
+    print(f"  get_county               {summary(timed(store.get_county, cities))}")
+    today = datetime.now(TAIPEI).date().isoformat()
+    print(f"  get_astronomical         {summary(timed(lambda _: store.get_astronomical(today), range(args.lookups // 50)))}")
+    counties = {city: store.get_county(city) for city in prefetcher.cities}
+    replace = timed(lambda city: store.put_forecasts(city, counties[city][0], counties[city][1], replace=True), prefetcher.cities * 3)
+    print(f"  county replace           p50 {percentile(replace, 50) / 1e3:7.2f} ms, p99 {percentile(replace, 99) / 1e3:7.2f} ms")
+
+    # 新的 worker 啟動後的第一批查詢
+    print(f"first {args.queries} queries of a new worker")
+    queries = [random.choice(towns) for _ in range(args.queries)]
+    first_queries("no store", handler, server.server_port, None, queries)
+    first_queries("shared store", handler, server.server_port, ForecastStore(path), queries)
+    warm = new_service(server.server_port, ForecastStore(path))
+    warm_prefetcher = ForecastPrefetcher(warm)
+    calls = handler.calls
+    start = time.perf_counter()
+    loaded = warm_prefetcher.warm_start()
+    print(f"  prefetcher warm start: {loaded}/{len(warm_prefetcher.cities)} counties in {(time.perf_counter() - start) * 1e3:.1f} ms, "
+          f"CWA calls {handler.calls - calls}, ready {warm_prefetcher.ready()}")
+    # 另一個 worker 的背景更新: 其他程序已寫入且尚未到期的縣市不重新向 CWA 取得
+    other_prefetcher = ForecastPrefetcher(new_service(server.server_port, ForecastStore(path)))
+    calls = handler.calls
+    cycle = other_prefetcher.refresh_all()
+    print(f"  another worker's refresh cycle: {cycle['counties']} counties from CWA, {cycle['shared']} from the store, "
+          f"CWA calls {handler.calls - calls}")
+
+    # 另一個程序讀取的同時替換縣市資料
+    result = multiprocessing.get_context("spawn").Queue()
+    process = multiprocessing.get_context("spawn").Process(target=reader, args=(path, towns, 2.0, result))
+    process.start()
+    time.sleep(0.5)
+    writes = 0
+    deadline = time.perf_counter() + 1.0
+    while time.perf_counter() < deadline:
+        city = prefetcher.cities[writes % len(prefetcher.cities)]
+        store.put_forecasts(city, counties[city][0], counties[city][1], replace=True)
+        writes += 1
+    reads, errors, found, p50, p99, worst = result.get()
+    process.join()
+    print(f"concurrent: {writes} county replaces while another process read {reads} times: "
+          f"errors {errors}, found {found}/{reads}, p50 {p50:.1f} us, p99 {p99:.1f} us, max {worst / 1e3:.2f} ms")
+    server.shutdown()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+比較 SuggestionEngine 與原本 get_suggestions 的 if/elif 規則的計算時間
+(結果相同的性質測試在 tests/test_suggestion.py)
+
+python benchmarks/suggestion_engine.py
+"""
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api.suggestion import SuggestionEngine
+from tests.test_suggestion import legacy_suggestions, random_forecasts
+
+
+def main(towns=30, periods=14, number=20):
+    rng = random.Random(0)
+    engine = SuggestionEngine()
+
+    # 單一鄉鎮(使用者查詢，純 Python)與整個縣市(背景更新，NumPy)
+    for count in (1, towns):
+        forecasts = random_forecasts(rng, count, periods)
+
+        def batch():
+            for forecast in forecasts:
+                for period in forecast.periods:
+                    period.suggestions = None
+            engine.annotate(forecasts)
+
+        # 第一次呼叫會載入 NumPy，不計入時間
+        batch()
+        legacy_time = timeit.timeit(lambda: [legacy_suggestions(f, i) for f in forecasts for i in range(periods)], number=number) / number
+        batch_time = timeit.timeit(batch, number=number) / number
+        print(f"{count} towns x {periods} periods: legacy {legacy_time * 1e3:.2f} ms, engine {batch_time * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+座標找鄉鎮(TownLocator)測試: 量測每秒查詢數並與逐一比對所有代表點的結果比較，
+檢查 Address.json 中的縣市鄉鎮是否都有代表點，並比較位置訊息以座標與以地址文字(Azure CLU)找出鄉鎮的延遲
+需要以 python -m api.town_locator 由實際的 CWA 資料建立的代表點資料；
+準確度只以 --points 指定的實際座標(緯度,經度,縣市,鄉鎮 的 CSV，例如實際位置訊息與其所在鄉鎮)計算，
+代表點附近的座標只用於檢查一致性，不代表準確度
+
+CWA_API_KEY=... python -m api.town_locator Township.json
+python benchmarks/town_locator.py --township Township.json [--points points.csv] [--lookups 200000]
+"""
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from e2e import ROOT, TOWNS, FakeCLU, FakeCWA, FakeLINE, app_environ, index_corpus, load_corpus, normalize, percentile, start_server
+
+# 臺灣本島與離島的範圍
+BOUNDS = ((21.8, 26.4), (118.1, 122.1))
+
+
+def nearest(locator, latitude, longitude):
+    """Returns 逐一比對所有代表點的結果，用來檢查網格索引
+    tuple: (city, town)
+    """
+    from api.town_locator import KM_PER_LAT, KM_PER_LON
+    x, y = longitude * KM_PER_LON, latitude * KM_PER_LAT
+    distance, i = min(((px - x) ** 2 + (py - y) ** 2, i) for i, (px, py) in enumerate(locator.points))
+    return locator.towns[i] if distance <= locator.max_distance ** 2 else None
+
+
+def offset(latitude, longitude, km):
+    """Returns 往隨機方向移動指定距離後的座標
+    tuple: (緯度, 經度)
+    """
+    from api.town_locator import KM_PER_LAT, KM_PER_LON
+    angle = random.uniform(0, 2 * math.pi)
+    return latitude + km * math.sin(angle) / KM_PER_LAT, longitude + km * math.cos(angle) / KM_PER_LON
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--township", required=True, help="代表點資料(python -m api.town_locator 由 CWA 資料建立)")
+    parser.add_argument("--points", help="實際座標與所在鄉鎮的 CSV(緯度,經度,縣市,鄉鎮)，用於計算準確度")
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--jitter", type=float, default=1.0, help="準確度測試時偏離代表點的距離(km)")
+    parser.add_argument("--resolves", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    corpus = load_corpus()
+    index_corpus(corpus)
+    servers = {
+        "cwa": start_server(FakeCWA.configure("FakeCWA", 0, 0)),
+        "clu": start_server(FakeCLU.configure("FakeCLU", 0.08, 0)),
+        "line": start_server(FakeLINE.configure("FakeLINE", 0, 0))
+    }
+    path = args.township
+    from api.town_locator import TownLocator
+    start = time.perf_counter()
+    locator = TownLocator.from_file(path)
+    if locator is None:
+        parser.error(f"{path} not found, build it with: CWA_API_KEY=... python -m api.town_locator {path}")
+    print(f"load: {len(locator.towns)} towns, {os.path.getsize(path) / 1024:.1f} KB, {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+    # 每秒查詢數: 代表點附近的座標(陸地上的位置訊息)與整個範圍內的隨機座標(包含海上)
+    from api.town_locator import KM_PER_LAT, KM_PER_LON
+    centroids = [(y / KM_PER_LAT, x / KM_PER_LON) for x, y in locator.points]
+    points = [offset(*random.choice(centroids), random.uniform(0, 5)) for _ in range(args.lookups)]
+    anywhere = [(random.uniform(*BOUNDS[0]), random.uniform(*BOUNDS[1])) for _ in range(args.lookups)]
+    for name, items in (("near towns", points), ("anywhere in bounds", anywhere)):
+        start = time.perf_counter()
+        results = [locator.locate(lat, lon) for lat, lon in items]
+        elapsed = time.perf_counter() - start
+        sample = random.sample(range(len(items)), 2000)
+        agree = sum(results[i] == nearest(locator, *items[i]) for i in sample)
+        print(f"  {name:<20} {len(items) / elapsed:10,.0f} lookups/s, {elapsed / len(items) * 1e6:.2f} us/lookup, "
+              f"found {sum(result is not None for result in results) / len(results):.1%}, "
+              f"matches brute force {agree}/{len(sample)}")
+
+    # Address.json 中的縣市鄉鎮: 是否有代表點、代表點與附近的座標是否找回同一個鄉鎮(一致性，不是準確度)
+    expected = sorted({(city, town) for city, towns in TOWNS.items() for town in towns})
+    index = dict(zip(locator.towns, centroids))
+    covered = [place for place in expected if place in index]
+    exact = sum(locator.locate(*index[place]) == place for place in covered)
+    jittered = [(place, offset(*index[place], args.jitter)) for place in covered for _ in range(20)]
+    near = sum(locator.locate(*point) == place for place, point in jittered)
+    print(f"Address.json: {len(covered)}/{len(expected)} towns covered, consistency: centroid -> same town {exact}/{len(covered)}, "
+          f"{args.jitter:g} km away -> same town {near}/{len(jittered)} ({near / max(len(jittered), 1):.1%})")
+
+    # 準確度: 實際座標找出的鄉鎮與其所在鄉鎮相同的比例(找不到時改以地址文字分析，不算錯誤)
+    if args.points:
+        with open(args.points, "r", encoding="utf-8", newline="") as f:
+            labelled = [(float(lat), float(lon), (normalize(city), normalize(town))) for lat, lon, city, town in csv.reader(f)]
+        results = [locator.locate(lat, lon) for lat, lon, _ in labelled]
+        correct = sum(result == place for result, (_, _, place) in zip(results, labelled))
+        wrong = sum(result is not None and result != place for result, (_, _, place) in zip(results, labelled))
+        print(f"accuracy ({args.points}): correct {correct}/{len(labelled)} ({correct / max(len(labelled), 1):.1%}), "
+              f"wrong {wrong}, not found {len(labelled) - correct - wrong}")
+    else:
+        print("accuracy: skipped (--points not given)")
+
+    # 位置訊息: 以座標與以地址文字找出鄉鎮的延遲(英文地址無法在本機比對，需呼叫 Azure CLU)
+    os.environ.update(app_environ(servers), TOWNSHIP_PATH=path, LAZY_INIT="1")
+    import app as bot
+    messages = []
+    for item in random.sample(corpus, min(args.resolves, len(corpus))):
+        spans = {entity["category"]: normalize(item["text"][entity["offset"]:entity["offset"] + entity["length"]]) for entity in item["entities"]}
+        if (spans.get("city"), spans.get("town")) in index:
+            messages.append((f"No. {random.randint(1, 300)}, Sec. 1, Zhongzheng Rd., Taiwan", index[(spans["city"], spans["town"])]))
+    # 先建立索引與比對器，不計入延遲
+    bot.config.townLocator, bot.config.gazetteer, bot.config.azureService
+    print("location message -> (city, town)")
+    for name, coordinates in (("coordinates", True), ("address text (CLU)", False)):
+        latency, resolved = [], 0
+        for text, point in messages:
+            start = time.perf_counter()
+            resolved += bot.resolve_location(text, point if coordinates else None) is not None
+            latency.append((time.perf_counter() - start) * 1e3)
+        print(f"  {name:<20} resolved {resolved}/{len(messages)}, p50 {percentile(latency, 50):.3f} ms, p99 {percentile(latency, 99):.3f} ms")
+
+    for server in servers.values():
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,7 @@
 import sys
 import os
-from linebot.v3 import (
-    WebhookHandler
-)
-from linebot.v3.messaging import (
-    Configuration
-)
-from api.azure import AzureService
-from api.weather import WeatherService
+import threading
+from api.metrics import metrics
 
 class Singleton(type):
     _instances = {}
@@ -16,11 +10,71 @@ class Singleton(type):
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
     
+# 建立共用物件時的鎖(物件之間互相依賴，使用同一個可重入鎖)
+_init_lock = threading.RLock()
+
+class lazy_property:
+    """
+    第一次使用時才建立並保存在物件上，之後直接使用(LINE、Azure 等 SDK 也在此時才載入)
+    """
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        with _init_lock:
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.func(obj)
+        return obj.__dict__[self.name]
+
 class Config(metaclass=Singleton):
     def __init__(self):
         self.CHANNEL_SECRET = os.getenv('CHANNEL_SECRET')
         self.CHANNEL_ACCESS_TOKEN = os.getenv('CHANNEL_ACCESS_TOKEN')
         self.CWA_API_KEY = os.getenv('CWA_API_KEY')
+        # 外部 API 位址(可指向本機的替代服務進行測試)
+        self.CWA_API_ROOT = os.getenv('CWA_API_ROOT', 'https://opendata.cwa.gov.tw/api/v1/rest/datastore')
+        self.LINE_API_HOST = os.getenv('LINE_API_HOST', 'https://api.line.me')
+        # 是否在背景預先取得所有縣市的預報(需常駐的程序，不適用於 serverless)
+        self.FORECAST_PREFETCH = os.getenv('FORECAST_PREFETCH') == '1'
+        # 是否先回應 /callback 再由背景執行緒處理事件
+        self.ASYNC_WEBHOOK = os.getenv('ASYNC_WEBHOOK') == '1'
+        self.WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+        self.WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '100'))
+        # 是否將同一個 webhook 中的事件依地點合併處理
+        self.BATCH_EVENTS = os.getenv('BATCH_EVENTS', '1') == '1'
+        # 已渲染 Flex Message 的快取數量與時間區間(秒)
+        self.RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '512'))
+        self.RENDER_CACHE_BUCKET = int(os.getenv('RENDER_CACHE_BUCKET', '3600'))
+        # 對外呼叫共用的連線池設定
+        self.HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+        self.HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+        self.HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+        # CWA 請求的速率限制(每秒請求數，<= 0 不限制)、可累積的請求數與使用者請求的最長等待秒數
+        self.CWA_RATE_LIMIT = float(os.getenv('CWA_RATE_LIMIT', '5'))
+        self.CWA_BURST = int(os.getenv('CWA_BURST', '10'))
+        self.CWA_MAX_WAIT = float(os.getenv('CWA_MAX_WAIT', '3'))
+        # 多個 worker/程序共用的預報快照(SQLite 檔案路徑)，未設定則不使用
+        self.FORECAST_STORE = os.getenv('FORECAST_STORE')
+        # 各階段耗時與對外呼叫次數統計(/metrics)
+        self.METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+        # 取樣分析 /callback 的比例，以及是否允許以 ?profile=1 指定分析單一請求
+        self.PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS') == '1'
+        # 是否記錄 /callback 的請求內容(包含使用者訊息)
+        self.LOG_REQUEST_BODY = os.getenv('LOG_REQUEST_BODY') == '1'
+        metrics.enabled = self.METRICS_ENABLED
+        # 是否在第一次使用時才建立 SDK client 與載入資料(縮短 serverless 冷啟動時間)
+        self.LAZY_INIT = os.getenv('LAZY_INIT') == '1'
+        # 預先建立的 Flex 模板與地名比對資料(python -m api.snapshot)，設為空字串則不使用
+        self.SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', './snapshot.pickle')
+        # 鄉鎮代表點資料(python -m api.town_locator 由 CWA 資料建立)，位置訊息以座標找出鄉鎮
+        # 未設定或檔案不存在時改以地址文字分析(尚未隨專案提供代表點資料，需要時自行建立並設定)
+        self.TOWNSHIP_PATH = os.getenv('TOWNSHIP_PATH', '')
+        # 圖示的內容雜湊檔名對照表(python -m api.assets 建立)，不存在時使用 static 下的原始檔案
+        self.ASSET_MANIFEST = os.getenv('ASSET_MANIFEST', './static/dist/manifest.json')
         self.check_env()
         self.line_bot_init()
 
@@ -34,7 +88,106 @@ class Config(metaclass=Singleton):
             sys.exit(1)
         
     def line_bot_init(self):
-        self.handler = WebhookHandler(self.CHANNEL_SECRET)
-        self.configuration = Configuration(access_token=self.CHANNEL_ACCESS_TOKEN)
-        self.azureService = AzureService()
-        self.weatherService = WeatherService(self.CWA_API_KEY)
\ No newline at end of file
+        if not self.LAZY_INIT:
+            for name in ("handler", "httpClient", "configuration", "lineBotApi", "azureService", "gazetteer", "townLocator", "weatherService", "flexTemplates"):
+                getattr(self, name)
+        if self.ASYNC_WEBHOOK:
+            self.eventDispatcher
+        if self.FORECAST_PREFETCH:
+            self.forecastPrefetcher
+
+    def is_loaded(self, name: str):
+        """Returns 共用物件是否已建立
+        bool: 是否已建立
+        """
+        return name in self.__dict__
+
+    @lazy_property
+    def handler(self):
+        from linebot.v3 import WebhookHandler
+        return WebhookHandler(self.CHANNEL_SECRET)
+
+    @lazy_property
+    def eventDispatcher(self):
+        from api.dispatcher import EventDispatcher
+        eventDispatcher = EventDispatcher(self.WEBHOOK_WORKERS, self.WEBHOOK_QUEUE_SIZE)
+        if self.ASYNC_WEBHOOK:
+            eventDispatcher.start()
+        return eventDispatcher
+
+    @lazy_property
+    def httpClient(self):
+        from api.http_client import HttpClient
+        return HttpClient(self.HTTP_POOL_SIZE, self.HTTP_TIMEOUT, self.HTTP_RETRIES)
+
+    @lazy_property
+    def configuration(self):
+        from linebot.v3.messaging import Configuration
+        configuration = Configuration(host=self.LINE_API_HOST, access_token=self.CHANNEL_ACCESS_TOKEN)
+        configuration.connection_pool_maxsize = self.HTTP_POOL_SIZE
+        configuration.retries = self.httpClient.retry
+        return configuration
+
+    @lazy_property
+    def lineBotApi(self):
+        from linebot.v3.messaging import ApiClient, MessagingApi
+        # 整個程序共用同一個 ApiClient，保留與 LINE 的連線
+        api_client = ApiClient(self.configuration)
+        self.httpClient.register("line", api_client.rest_client.pool_manager)
+        return MessagingApi(api_client)
+
+    @lazy_property
+    def azureService(self):
+        from api.azure import AzureService
+        return AzureService(timeout=self.HTTP_TIMEOUT, http_client=self.httpClient)
+
+    @lazy_property
+    def gazetteer(self):
+        from api.gazetteer import Gazetteer
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return Gazetteer.from_snapshot(snapshot["gazetteer"])
+        from api.weather import WeatherService
+        return Gazetteer.from_files(WeatherService.api_map)
+
+    @lazy_property
+    def weatherService(self):
+        from api.weather import WeatherService
+        from api.scheduler import RequestScheduler
+        scheduler = RequestScheduler(self.CWA_RATE_LIMIT, self.CWA_BURST, {RequestScheduler.USER: self.CWA_MAX_WAIT})
+        store = None
+        if self.FORECAST_STORE:
+            from api.store import ForecastStore
+            store = ForecastStore(self.FORECAST_STORE)
+        return WeatherService(self.CWA_API_KEY, http_client=self.httpClient, api_root=self.CWA_API_ROOT, scheduler=scheduler, store=store, assets=self.assets)
+
+    @lazy_property
+    def forecastPrefetcher(self):
+        from api.prefetcher import ForecastPrefetcher
+        forecastPrefetcher = ForecastPrefetcher(self.weatherService)
+        if self.FORECAST_PREFETCH:
+            forecastPrefetcher.start()
+        return forecastPrefetcher
+
+    @lazy_property
+    def flexTemplates(self):
+        from api.flex_template import FlexTemplate, load_templates
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return {name: FlexTemplate.from_snapshot(data) for name, data in snapshot["templates"].items()}
+        return load_templates()
+
+    @lazy_property
+    def assets(self):
+        from api.assets import AssetManifest
+        return AssetManifest.from_file(self.ASSET_MANIFEST) if self.ASSET_MANIFEST else AssetManifest()
+
+    @lazy_property
+    def townLocator(self):
+        from api.town_locator import TownLocator
+        return TownLocator.from_file(self.TOWNSHIP_PATH) if self.TOWNSHIP_PATH else None
+
+    @lazy_property
+    def snapshot(self):
+        from api.snapshot import load_snapshot
+        return load_snapshot(self.SNAPSHOT_PATH) if self.SNAPSHOT_PATH else None
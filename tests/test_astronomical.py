@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+
+from api.forecast import TAIPEI
+from api.scheduler import RequestScheduler
+from api.weather import WeatherService
+
+
+class StubResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StubCWA:
+    """
+    以 URL 的 timeFrom/timeTo 產生各縣市每日的天文時刻，可設定為失敗與延遲
+    """
+    def __init__(self, fail=False, latency=0.0):
+        self.fail = fail
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, api_url):
+        with self.lock:
+            self.calls.append(api_url)
+        time.sleep(self.latency)
+        if self.fail:
+            return None
+        url = urlsplit(api_url)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        start, end = date.fromisoformat(query["timeFrom"]), date.fromisoformat(query["timeTo"])
+        days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        if url.path.endswith("A-B0062-001"):
+            row = {"SunRiseTime": "06:05", "SunSetTime": "17:25"}
+        else:
+            row = {"MoonRiseTime": "14:10", "MoonSetTime": "01:30"}
+        return StubResponse({"records": {"locations": {"location": [
+            {"CountyName": city, "time": [{"Date": day, **row} for day in days]} for city in WeatherService.api_map
+        ]}}})
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class AstronomicalTimeTest(unittest.TestCase):
+    def make_service(self, cwa, now):
+        clock = Clock(now)
+        service = WeatherService("test", api_root="http://cwa.invalid/api", scheduler=RequestScheduler(rate=0), clock=clock)
+        service.request_weather = cwa
+        return service, clock
+
+    def test_rolls_over_at_taipei_midnight(self):
+        cwa = StubCWA()
+        service, clock = self.make_service(cwa, datetime(2026, 10, 18, 23, 59, 59, tzinfo=TAIPEI))
+        self.assertEqual(service.get_astronomical_time("臺北市")["Date"], "2026-10-18")
+        self.assertEqual(len(cwa.calls), 2)
+
+        # 臺北時間 00:00:00 已是隔天(UTC 仍為前一天 16:00)，隔天的資料已在同一次載入中取得
+        clock.now = datetime(2026, 10, 19, 0, 0, 0, tzinfo=TAIPEI)
+        self.assertEqual(clock.now.astimezone(timezone.utc).date().isoformat(), "2026-10-18")
+        self.assertEqual(service.get_astronomical_time("臺北市")["Date"], "2026-10-19")
+        self.assertEqual(len(cwa.calls), 2)
+
+    def test_cached_date_makes_no_network_call(self):
+        cwa = StubCWA()
+        service, _ = self.make_service(cwa, datetime(2026, 10, 18, 12, 0, tzinfo=TAIPEI))
+        first = service.get_astronomical_time("高雄市")
+        calls = len(cwa.calls)
+        for city in WeatherService.api_map:
+            self.assertTrue(service.get_astronomical_time(city))
+        self.assertEqual(service.get_astronomical_time("高雄市"), first)
+        self.assertEqual(len(cwa.calls), calls)
+
+    def test_failed_load_backs_off(self):
+        cwa = StubCWA(fail=True)
+        service, clock = self.make_service(cwa, datetime(2026, 10, 18, 12, 0, tzinfo=TAIPEI))
+        self.assertEqual(service.get_astronomical_time("臺北市"), {})
+        self.assertEqual(service.get_astronomical_time("臺北市"), {})
+        self.assertEqual(len(cwa.calls), 2)
+
+        # 超過 astronomical_retry 後重試，成功後不再呼叫
+        cwa.fail = False
+        clock.now += timedelta(seconds=WeatherService.astronomical_retry)
+        self.assertEqual(service.get_astronomical_time("臺北市")["SunRiseTime"], "06:05")
+        self.assertEqual(len(cwa.calls), 4)
+
+    def test_concurrent_failures_share_one_request(self):
+        cwa = StubCWA(fail=True, latency=0.2)
+        service, _ = self.make_service(cwa, datetime(2026, 10, 18, 12, 0, tzinfo=TAIPEI))
+        barrier = threading.Barrier(6)
+        results = []
+
+        def lookup():
+            barrier.wait()
+            results.append(service.get_astronomical_time("臺北市"))
+
+        threads = [threading.Thread(target=lookup) for _ in range(6)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.assertEqual(results, [{}] * 6)
+        self.assertEqual(len(cwa.calls), 2)
+        # 不因等待鎖而依序重試: 全部在兩次請求的時間內完成
+        self.assertLess(elapsed, 0.2 * 2 + 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
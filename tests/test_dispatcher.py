@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import unittest
+from unittest import mock
+
+from api.dispatcher import EventDispatcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_event(event_id, message=None):
+    event = {
+        "type": "message" if message else "follow",
+        "mode": "active",
+        "timestamp": 0,
+        "webhookEventId": event_id,
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": event_id,
+        "source": {"type": "user", "userId": "U0"}
+    }
+    if message:
+        event["message"] = {"id": event_id, "quoteToken": "q", **message}
+    return event
+
+
+class EventDispatcherTest(unittest.TestCase):
+    def test_process_in_workers(self):
+        dispatcher = EventDispatcher(workers=2, queue_size=10)
+        dispatcher.start()
+        threads = []
+        for i in range(5):
+            self.assertTrue(dispatcher.submit(lambda item: threads.append(threading.current_thread().name), i))
+        dispatcher.queue.join()
+        self.assertEqual(len(threads), 5)
+        self.assertTrue(all(name.startswith("event-dispatcher-") for name in threads))
+        self.assertEqual(dispatcher.stats()["processed"], 5)
+
+    def test_full_queue_runs_inline(self):
+        # 沒有啟動背景執行緒，佇列滿後在呼叫端處理
+        dispatcher = EventDispatcher(workers=1, queue_size=1, put_timeout=0)
+        items = []
+        self.assertTrue(dispatcher.submit(items.append, 1))
+        self.assertFalse(dispatcher.submit(items.append, 2))
+        self.assertEqual(items, [2])
+        self.assertEqual(dispatcher.stats()["inline"], 1)
+
+    def test_errors_are_counted(self):
+        dispatcher = EventDispatcher(workers=1, queue_size=1, put_timeout=0)
+        dispatcher.queue.put(None)
+        with mock.patch("builtins.print"):
+            dispatcher.submit(lambda item: 1 / 0, 1)
+        stats = dispatcher.stats()
+        self.assertEqual((stats["processed"], stats["errors"]), (1, 1))
+
+
+class AsyncWebhookTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        for key, value in {"CHANNEL_SECRET": "test", "CHANNEL_ACCESS_TOKEN": "test", "CWA_API_KEY": "test", "LAZY_INIT": "1"}.items():
+            os.environ.setdefault(key, value)
+        cls.cwd = os.getcwd()
+        os.chdir(ROOT)
+        import app
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+
+    def setUp(self):
+        config = self.app.config
+        self.dispatcher = EventDispatcher(workers=1, queue_size=10)
+        self.dispatcher.start()
+        patches = [
+            mock.patch.object(config, "ASYNC_WEBHOOK", True),
+            mock.patch.object(config, "BATCH_EVENTS", False),
+            mock.patch.dict(config.__dict__, {"eventDispatcher": self.dispatcher}),
+            mock.patch.object(self.app, "reply_weather")
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.reply_weather = self.app.reply_weather
+        self.client = self.app.app.test_client()
+
+    def post(self, events, signature=None):
+        body = json.dumps({"destination": "test", "events": events})
+        if signature is None:
+            signature = base64.b64encode(hmac.new(self.app.config.CHANNEL_SECRET.encode(), body.encode(), hashlib.sha256).digest()).decode()
+        return self.client.post("/callback", data=body, headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+
+    def test_unbatched_events_use_registered_handlers(self):
+        # 逐一處理事件時，背景執行緒以 WebhookHandler.handle 呼叫註冊的處理函式，其他事件略過
+        response = self.post([
+            make_event("1", {"type": "text", "text": "苗栗縣苑裡鎮"}),
+            make_event("2"),
+            make_event("3", {"type": "location", "address": "苑裡", "latitude": 24.4, "longitude": 120.6})
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.dispatcher.queue.join()
+        calls = [(call.args[0].webhook_event_id, call.args[1:]) for call in self.reply_weather.call_args_list]
+        self.assertEqual(calls, [("1", ("苗栗縣苑裡鎮",)), ("3", ("苑裡", (24.4, 120.6)))])
+        self.assertEqual(self.dispatcher.stats()["errors"], 0)
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.post([make_event("1", {"type": "text", "text": "苗栗縣苑裡鎮"})], signature="invalid")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.dispatcher.stats()["submitted"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from api.fileutil import atomic_write
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data.json")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("old")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replaces_file(self):
+        with atomic_write(self.path, encoding="utf-8") as f:
+            f.write("new")
+            # 寫入完成前讀取到的仍是原本的檔案
+            with open(self.path, "r", encoding="utf-8") as current:
+                self.assertEqual(current.read(), "old")
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "new")
+        self.assertEqual(os.listdir(self.directory.name), ["data.json"])
+
+    def test_failure_keeps_original(self):
+        with self.assertRaises(ValueError):
+            with atomic_write(self.path, "wb") as f:
+                f.write(b"partial")
+                raise ValueError
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(self.directory.name), ["data.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
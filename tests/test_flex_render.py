@@ -0,0 +1,175 @@
+import json
+import os
+import random
+import re
+import unittest
+from datetime import datetime, timedelta
+
+from api.flex_template import FlexTemplate
+from api.forecast import Forecast, ForecastPeriod
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLEX_DIRECTORY = os.path.join(ROOT, "flex")
+TEMPLATES = ((1, 2), (1, 3), (2, 2), (2, 3))
+URL_ROOT = "https://example.com/"
+# 隨機變數值使用的字元(包含換行，不包含 {{ }})
+CHARACTERS = "晴多雲陰短暫雨午後雷陣0123456789 ,.-:/_%()'\n"
+
+
+def replace_variable(text, variable_dict, max_count=0):
+    """
+    原本 LineBotHelper.replace_variable 的實作(已自 api 移除，保留作為比較基準)
+    """
+    replaced_count = {}
+
+    def replace(match):
+        key = match.group(1)
+        if max_count:
+            if key not in replaced_count:
+                replaced_count[key] = 1
+            else:
+                replaced_count[key] += 1
+                if replaced_count[key] > max_count:
+                    return match.group(0)
+        return str(variable_dict.get(key, match.group(0)))
+
+    return re.sub(r'\{\{([a-zA-Z0-9_]*)\}\}', replace, text)
+
+
+def legacy_render(path, inputs):
+    """
+    原本 get_weather_flex 讀檔後逐次替換變數的流程
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        line_flex_str = json.dumps(json.load(f))
+    for i in range(len(inputs["cloth_text"])):
+        line_flex_str = replace_variable(line_flex_str, {"cloth_text": inputs["cloth_text"][i], "cloth_icon": inputs["cloth_icon"][i]}, 1)
+    for i in range(len(inputs["suggestion_text"])):
+        line_flex_str = replace_variable(line_flex_str, {"suggestion_text": inputs["suggestion_text"][i], "suggestion_icon": inputs["suggestion_icon"][i]}, 1)
+    line_flex_str = replace_variable(line_flex_str, inputs["common"])
+    for i in range(3):
+        params = {key: inputs[key][i] for key in ("time_desc", "minT", "maxT", "PoP", "Wx_url", "Wx_desc")}
+        if i != 0:
+            params["cloth"] = inputs["cloth"][i - 1]
+        line_flex_str = replace_variable(line_flex_str, params, 1).replace('\n', '')
+    return line_flex_str
+
+
+def random_text(rng, length=8):
+    return "".join(rng.choice(CHARACTERS) for _ in range(rng.randint(1, length)))
+
+
+def random_inputs(rng, cloth_amount, suggestion_amount):
+    return {
+        "cloth_text": [random_text(rng) for _ in range(cloth_amount)],
+        "cloth_icon": [f"{URL_ROOT}{random_text(rng)}.png" for _ in range(cloth_amount)],
+        "suggestion_text": [random_text(rng) for _ in range(suggestion_amount)],
+        "suggestion_icon": [f"{URL_ROOT}{random_text(rng)}.png" for _ in range(suggestion_amount)],
+        "common": {
+            key: random_text(rng) for key in ("city", "town", "sunrise_time", "sunset_time", "moonrise_time", "moonset_time")
+        } | {"sun_width": rng.randint(0, 100), "moon_width": rng.randint(0, 100)},
+        **{key: [random_text(rng) for _ in range(3)] for key in ("time_desc", "minT", "maxT", "PoP", "Wx_url", "Wx_desc")},
+        "cloth": [random_text(rng) for _ in range(2)]
+    }
+
+
+def random_forecast(rng):
+    start = datetime(2026, 10, 18, rng.choice((0, 6, 12, 18)))
+    periods = []
+    for i in range(14):
+        min_at = rng.randint(-5, 40)
+        min_t = rng.randint(-5, 35)
+        periods.append(ForecastPeriod(
+            start + timedelta(hours=12 * i), rng.choice(["晴", "多雲", "陰短暫雨", "午後短暫雷陣雨"]), f"{rng.randint(1, 42):02d}",
+            str(rng.randrange(0, 101, 10)), str(min_t), str(min_t + rng.randint(0, 10)),
+            str(min_at), str(min_at + rng.randint(0, 10)), str(rng.randint(40, 100)),
+            str(rng.randint(0, 12)), rng.choice([str(rng.randint(0, 12)), f">= {rng.randint(0, 12)}"])
+        ))
+    return Forecast(periods)
+
+
+def legacy_weather_flex(service, url_root, weather_data, astronomical_data, city, town, sun_width, moon_width):
+    """
+    原本 get_weather_flex 的流程(圖示網址使用目前的 get_weather_icon)，日照/月照百分比由參數指定
+    """
+    time_desc = service.get_time_desc(weather_data["start_time"][0])
+    cloth_text, cloth_icon, suggestion_text, suggestion_icon = service.get_suggestions(url_root, weather_data, 0)
+    if len(suggestion_text) > 3:
+        suggestion_text = suggestion_text[:3]
+        suggestion_icon = suggestion_icon[:3]
+    return legacy_render(os.path.join(FLEX_DIRECTORY, f"suggestion_{len(cloth_text)}{len(suggestion_text)}.json"), {
+        "cloth_text": cloth_text,
+        "cloth_icon": cloth_icon,
+        "suggestion_text": suggestion_text,
+        "suggestion_icon": suggestion_icon,
+        "common": {
+            "city": city,
+            "town": town,
+            "sunrise_time": astronomical_data["SunRiseTime"],
+            "sunset_time": astronomical_data["SunSetTime"],
+            "sun_width": sun_width,
+            "moon_width": moon_width,
+            "moonrise_time": astronomical_data["MoonRiseTime"],
+            "moonset_time": astronomical_data["MoonSetTime"]
+        },
+        "time_desc": time_desc,
+        "minT": weather_data["MinT"],
+        "maxT": weather_data["MaxT"],
+        "PoP": weather_data["PoP12h"],
+        "Wx_url": [service.get_weather_icon(url_root, code, start) for code, start in zip(weather_data["Wx_code"][:3], weather_data["start_time"][:3])],
+        "Wx_desc": weather_data["Wx_desc"],
+        "cloth": [', '.join(service.get_suggestions(url_root, weather_data, i)[0]) for i in range(1, 3)]
+    })
+
+
+class FlexTemplateTest(unittest.TestCase):
+    def test_matches_replace_variable_chain(self):
+        rng = random.Random(0)
+        for cloth_amount, suggestion_amount in TEMPLATES:
+            path = os.path.join(FLEX_DIRECTORY, f"suggestion_{cloth_amount}{suggestion_amount}.json")
+            template = FlexTemplate.load(path)
+            for _ in range(100):
+                inputs = random_inputs(rng, cloth_amount, suggestion_amount)
+                variables = {key: value for key, value in inputs.items() if key != "common"}
+                variables.update(inputs["common"])
+                self.assertEqual(template.render(variables), legacy_render(path, inputs))
+
+    def test_missing_variables_are_kept(self):
+        template = FlexTemplate('{"a": "{{x}}", "b": "{{y}}", "c": "{{x}}"}')
+        self.assertEqual(template.render({"x": ["1"]}), '{"a": "1", "b": "{{y}}", "c": "{{x}}"}')
+        self.assertEqual(template.render({"x": "2"}), '{"a": "2", "b": "{{y}}", "c": "2"}')
+
+
+class WeatherFlexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        for key, value in {"CHANNEL_SECRET": "test", "CHANNEL_ACCESS_TOKEN": "test", "CWA_API_KEY": "test", "LAZY_INIT": "1"}.items():
+            os.environ.setdefault(key, value)
+        cls.cwd = os.getcwd()
+        os.chdir(ROOT)
+        import app
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+
+    def test_cached_template_with_widths_matches_legacy(self):
+        # 快取的模板(保留日照/月照百分比)填入百分比後，與原本一次替換所有變數的結果相同
+        rng = random.Random(0)
+        service = self.app.config.weatherService
+        templates = set()
+        for _ in range(300):
+            forecast = random_forecast(rng)
+            astronomical = {key: f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}" for key in ("SunRiseTime", "SunSetTime", "MoonRiseTime", "MoonSetTime")}
+            sun_width, moon_width = rng.randint(0, 100), rng.randint(0, 100)
+            flex = self.app.render_weather_template(URL_ROOT, forecast, astronomical, "苗栗縣", "苑裡鎮").render({"sun_width": sun_width, "moon_width": moon_width})
+            self.assertEqual(flex, legacy_weather_flex(service, URL_ROOT, forecast, astronomical, "苗栗縣", "苑裡鎮", sun_width, moon_width))
+            json.loads(flex)
+            clothes, suggestions = service.suggestion_engine.suggest(forecast.periods[0])
+            templates.add((len(clothes), min(len(suggestions), 3)))
+        self.assertEqual(templates, set(TEMPLATES))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from api.forecast import Forecast, parse_county
+from api.prefetcher import ForecastPrefetcher
+from api.scheduler import RequestScheduler
+from api.store import ForecastStore
+from api.weather import WeatherService
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "F-D0047-093_F-D0047-015.json")
+CITY = "苗栗縣"
+
+
+def load_forecasts():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return parse_county(json.load(f))
+
+
+class StubResponse:
+    def __init__(self, data):
+        self.data = data
+        self.content = json.dumps(data).encode()
+
+    def json(self):
+        return self.data
+
+
+class StubCountyFetch:
+    """
+    取代 WeatherService.fetch_county_forecast，回傳 fixture 的縣市預報
+    """
+    def __init__(self):
+        with open(FIXTURE, "r", encoding="utf-8") as f:
+            self.data = json.load(f)
+        self.calls = []
+
+    def __call__(self, city, priority):
+        self.calls.append(city)
+        return StubResponse(self.data)
+
+
+class StubFetch:
+    """
+    取代 WeatherService.fetch_12hr_forecast，記錄呼叫次數並回傳設定的預報(預設為失敗)
+    """
+    def __init__(self):
+        self.forecast = Forecast([])
+        self.calls = 0
+        self.called = threading.Event()
+
+    def __call__(self, city, town):
+        self.calls += 1
+        self.called.set()
+        return self.forecast
+
+
+class StoreFallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ForecastStore(os.path.join(self.directory.name, "forecast.db"))
+        self.service = WeatherService("test", api_root="http://cwa.invalid/api", scheduler=RequestScheduler(rate=0), store=self.store)
+        self.fetch = StubFetch()
+        self.service.fetch_12hr_forecast = self.fetch
+        self.forecasts = load_forecasts()
+        self.town = next(iter(self.forecasts))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get(self):
+        return self.service.get_12hr_forecast(CITY, self.town)
+
+    def wait_for_fetch(self, calls):
+        # 過期的快取在背景重新取得
+        deadline = time.time() + 5
+        while self.fetch.calls < calls and time.time() < deadline:
+            self.fetch.called.wait(0.05)
+            self.fetch.called.clear()
+        self.assertEqual(self.fetch.calls, calls)
+
+    def test_unexpired_store_skips_cwa(self):
+        self.store.put_forecasts(CITY, self.forecasts, time.time() + 600)
+        self.assertTrue(self.get())
+        self.assertTrue(self.get())
+        self.assertEqual(self.fetch.calls, 0)
+
+    def test_expired_store_is_not_cached_as_fresh(self):
+        # 快照已過期 30 分鐘且 CWA 失敗: 回傳快照的預報，但快取沿用快照的到期時間
+        self.store.put_forecasts(CITY, self.forecasts, time.time() - 1800)
+        forecast = self.get()
+        self.assertEqual(forecast.to_rows(), self.forecasts[self.town].to_rows())
+        self.assertEqual(self.fetch.calls, 1)
+
+        # 下次查詢時仍回傳舊的預報，並在背景重新向 CWA 取得
+        self.assertTrue(self.get())
+        self.wait_for_fetch(2)
+
+        # CWA 恢復後改用新的預報
+        fresh = load_forecasts()[self.town]
+        fresh.periods[0].MaxT = "99"
+        self.fetch.forecast = fresh
+        self.get()
+        self.wait_for_fetch(3)
+        deadline = time.time() + 5
+        while self.get() is not fresh and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIs(self.get(), fresh)
+        self.assertEqual(self.fetch.calls, 3)
+
+    def test_store_past_max_stale_is_not_used(self):
+        self.store.put_forecasts(CITY, self.forecasts, time.time() - WeatherService.max_stale - 1)
+        self.assertFalse(self.get())
+        self.assertEqual(self.fetch.calls, 1)
+
+
+class PrefetcherSharedStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "forecast.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def new_prefetcher(self):
+        service = WeatherService("test", api_root="http://cwa.invalid/api", scheduler=RequestScheduler(rate=0), store=ForecastStore(self.path))
+        service.fetch_county_forecast = StubCountyFetch()
+        return ForecastPrefetcher(service)
+
+    def test_refresh_uses_county_written_by_another_worker(self):
+        first = self.new_prefetcher()
+        self.assertEqual(first.refresh([CITY])["counties"], 1)
+
+        # 另一個 worker 的更新週期直接使用快照，不向 CWA 取得
+        second = self.new_prefetcher()
+        cycle = second.refresh([CITY])
+        self.assertEqual((cycle["counties"], cycle["shared"]), (0, 1))
+        self.assertEqual(second.weather_service.fetch_county_forecast.calls, [])
+        self.assertEqual(
+            {key for key in second.weather_service.forecast_index if key[0] == CITY},
+            {key for key in first.weather_service.forecast_index if key[0] == CITY}
+        )
+        self.assertEqual(second.weather_service.forecast_index_expires[CITY], first.weather_service.forecast_index_expires[CITY])
+        self.assertGreater(second.next_run[CITY], time.time())
+
+    def test_refresh_fetches_expired_or_partial_county(self):
+        store = ForecastStore(self.path)
+        forecasts = load_forecasts()
+        town = next(iter(forecasts))
+        # 只有個別鄉鎮(使用者查詢時寫入)的資料不視為整個縣市
+        store.put_forecasts(CITY, {town: forecasts[town]}, time.time() + 600)
+        prefetcher = self.new_prefetcher()
+        self.assertEqual(prefetcher.refresh([CITY])["counties"], 1)
+
+        # 整個縣市已到期
+        store.put_forecasts(CITY, forecasts, time.time() - 1, replace=True)
+        prefetcher = self.new_prefetcher()
+        self.assertEqual(prefetcher.refresh([CITY])["counties"], 1)
+        self.assertEqual(prefetcher.weather_service.fetch_county_forecast.calls, [CITY])
+
+
+if __name__ == "__main__":
+    unittest.main()
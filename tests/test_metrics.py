@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from api.metrics import ProfiledThreadPoolExecutor, SamplingProfiler
+
+
+def fetch_task():
+    time.sleep(0.1)
+
+
+def unrelated_task(stop):
+    while not stop.wait(0.001):
+        pass
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def test_samples_work_submitted_by_profiled_thread(self):
+        with ProfiledThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch") as executor:
+            with SamplingProfiler(interval=0.002) as profiler:
+                executor.submit(fetch_task).result()
+        stacks = [stack for stack in profiler.samples if "fetch_task" in stack]
+        self.assertTrue(stacks)
+        self.assertTrue(all(stack.startswith("fetch;") for stack in stacks))
+        # 工作結束後不再取樣該執行緒
+        self.assertEqual(set(profiler.threads), {profiler.thread_id})
+
+    def test_nested_submissions_are_sampled(self):
+        with ProfiledThreadPoolExecutor(max_workers=1, thread_name_prefix="batch") as batch, \
+                ProfiledThreadPoolExecutor(max_workers=1, thread_name_prefix="fetch") as fetch:
+            with SamplingProfiler(interval=0.002) as profiler:
+                batch.submit(lambda: fetch.submit(fetch_task).result()).result()
+        self.assertTrue(any(stack.startswith("fetch;") and "fetch_task" in stack for stack in profiler.samples))
+
+    def test_other_threads_are_not_sampled(self):
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as plain, ProfiledThreadPoolExecutor(max_workers=1) as executor:
+            # 未在取樣中提交的工作與一般的執行緒池都不會被取樣
+            other = executor.submit(unrelated_task, stop)
+            with SamplingProfiler(interval=0.002) as profiler:
+                plain.submit(fetch_task).result()
+            stop.set()
+            other.result()
+        self.assertFalse(any("unrelated_task" in stack or "fetch_task" in stack for stack in profiler.samples))
+
+    def test_propagate_without_profiler_returns_function(self):
+        self.assertIs(SamplingProfiler.propagate(fetch_task), fetch_task)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import unittest
+
+from api.forecast import Forecast, ForecastPeriod, parse_county
+from api.suggestion import BATCH_SIZE, SUGGESTION_FIELDS, SuggestionEngine, parse_value
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "F-D0047-093_F-D0047-015.json")
+
+
+def load_forecasts():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return parse_county(json.load(f))
+
+
+def legacy_suggestions(weather_data, index):
+    """
+    原本 WeatherService.get_suggestions 的規則(不含圖示)
+    """
+    minAT = int(weather_data["MinAT"][index])
+    maxAT = int(weather_data["MaxAT"][index])
+    PoP = int(weather_data["PoP12h"][index])
+    WS = int(weather_data["WS"][index].split(" ")[1]) if " " in weather_data["WS"][index] else int(weather_data["WS"][index])
+    UVI = int(weather_data["UVI"][index])
+    RH = int(weather_data["RH"][index])
+    clothes = []
+    suggestions = []
+
+    if maxAT >= 23:
+        clothes.append("短袖")
+    elif maxAT >= 18:
+        clothes.append("薄長袖")
+    else:
+        clothes.append("厚長袖")
+
+    if minAT <= 12:
+        clothes.append("羽絨外套")
+    elif minAT <= 17:
+        clothes.append("棉外套")
+    elif minAT <= 23:
+        clothes.append("薄外套")
+
+    if maxAT >= 36:
+        suggestions.append("注意高溫")
+    if minAT <= 12:
+        suggestions.append("注意低溫")
+    if PoP >= 30:
+        suggestions.append("攜帶雨具")
+    if UVI >= 8:
+        suggestions.append("注意防曬")
+    if WS >= 6:
+        suggestions.append("注意強風")
+
+    if PoP >= 50 or maxAT >= 38 or minAT <= 10:
+        suggestions.append("避免運動")
+    elif PoP >= 30 or maxAT >= 36 or minAT <= 12 or UVI >= 10:
+        suggestions.append("減少運動")
+    else:
+        suggestions.append("適合運動")
+
+    if RH >= 90:
+        suggestions.append("避免曬衣")
+    elif RH >= 80:
+        suggestions.append("減少曬衣")
+    else:
+        suggestions.append("適合曬衣")
+
+    return clothes, suggestions
+
+
+def random_period(rng):
+    min_at = rng.randint(-5, 40)
+    return ForecastPeriod(
+        None, "多雲", "04", str(rng.randrange(0, 101, 10)), "0", "0",
+        str(min_at), str(min_at + rng.randint(0, 10)), str(rng.randint(40, 100)),
+        str(rng.randint(0, 12)), rng.choice([str(rng.randint(0, 12)), f">= {rng.randint(0, 12)}", f"<= {rng.randint(0, 12)}"])
+    )
+
+
+def random_forecasts(rng, towns, periods):
+    return [Forecast([random_period(rng) for _ in range(periods)]) for _ in range(towns)]
+
+
+class SuggestionEngineTest(unittest.TestCase):
+    def test_parse_value(self):
+        self.assertEqual(parse_value("35"), 35)
+        self.assertEqual(parse_value(">= 11"), 11)
+        self.assertIsNone(parse_value("-"))
+        self.assertIsNone(parse_value(None))
+
+    def test_matches_legacy_rules(self):
+        # 性質測試: 隨機資料逐一與原本的 if/elif 規則比對(單一鄉鎮為純 Python，大量時段為 NumPy)
+        engine = SuggestionEngine()
+        rng = random.Random(0)
+        batches = [random_forecasts(rng, 1, 14) for _ in range(500)] + [random_forecasts(rng, 500, 14)]
+        self.assertLess(14, BATCH_SIZE)
+        for forecasts in batches:
+            engine.annotate(forecasts)
+            for forecast in forecasts:
+                for index, period in enumerate(forecast.periods):
+                    self.assertEqual(period.suggestions, legacy_suggestions(forecast, index))
+
+        # 未預先計算的時段(suggest)
+        for forecast in random_forecasts(rng, 200, 14):
+            for index, period in enumerate(forecast.periods):
+                self.assertEqual(engine.suggest(period), legacy_suggestions(forecast, index))
+
+    def test_unparsable_period_does_not_fail_batch(self):
+        engine = SuggestionEngine()
+        forecasts = load_forecasts()
+        broken = next(iter(forecasts.values()))
+        broken.periods[6].PoP12h = "-"
+        engine.annotate(forecasts.values())
+
+        # 只有無法解析的時段不預先計算，同一鄉鎮與其他鄉鎮的時段都有建議
+        self.assertIsNone(broken.periods[6].suggestions)
+        for forecast in forecasts.values():
+            for period in forecast.periods:
+                if period is not broken.periods[6] and all(parse_value(getattr(period, field)) is not None for field in SUGGESTION_FIELDS):
+                    self.assertIsNotNone(period.suggestions)
+
+    def test_suggest_ignores_unparsable_value(self):
+        engine = SuggestionEngine()
+        period = next(iter(load_forecasts().values())).periods[0]
+        period.PoP12h = "-"
+        clothes, suggestions = engine.suggest(period)
+        self.assertTrue(clothes)
+        self.assertNotIn("攜帶雨具", suggestions)
+
+    def test_python_and_numpy_paths_agree(self):
+        engine = SuggestionEngine()
+        rng = random.Random(0)
+        values = {field: [rng.choice([None] + list(range(-5, 101))) for _ in range(2000)] for field in SUGGESTION_FIELDS}
+        # NumPy 以 NaN 表示缺少的數值
+        arrays = {field: [float("nan") if value is None else value for value in column] for field, column in values.items()}
+        for i, row in enumerate(engine.evaluate(arrays)):
+            self.assertEqual(engine.evaluate_row({field: column[i] for field, column in values.items()}), list(row))
+
+    def test_single_forecast_does_not_import_numpy(self):
+        # 使用者查詢單一鄉鎮時不載入 NumPy(冷啟動的第一個請求)
+        code = (
+            "import json, sys\n"
+            "from api.forecast import parse_county\n"
+            "from api.suggestion import SuggestionEngine\n"
+            f"forecast = next(iter(parse_county(json.load(open({FIXTURE!r}, encoding='utf-8'))).values()))\n"
+            "SuggestionEngine().annotate([forecast])\n"
+            "assert any(period.suggestions for period in forecast.periods)\n"
+            "print('numpy' in sys.modules)\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
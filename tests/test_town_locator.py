@@ -0,0 +1,74 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from api.town_locator import KM_PER_LAT, KM_PER_LON, TownLocator
+
+
+def town(name, x, y):
+    """Returns 以平面公里座標建立的代表點
+    tuple: (city, town, 緯度, 經度)
+    """
+    return ("測試縣", name, y / KM_PER_LAT, x / KM_PER_LON)
+
+
+def locate_km(locator, x, y):
+    return locator.locate(y / KM_PER_LAT, x / KM_PER_LON)
+
+
+def brute_force(towns, x, y, max_distance):
+    """Returns 逐一比對所有代表點的最近鄉鎮(超過 max_distance 時為 None)
+    tuple: (city, town)
+    """
+    best = min(towns, key=lambda item: (item[3] * KM_PER_LON - x) ** 2 + (item[2] * KM_PER_LAT - y) ** 2)
+    distance = (best[3] * KM_PER_LON - x) ** 2 + (best[2] * KM_PER_LAT - y) ** 2
+    return best[:2] if distance <= max_distance ** 2 else None
+
+
+class TownLocatorTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        # 密集與稀疏的區域、網格比最遠距離小或大的設定
+        towns = [town(f"t{i}", rng.uniform(0, 60), rng.uniform(0, 60)) for i in range(200)]
+        towns += [town(f"s{i}", rng.uniform(60, 400), rng.uniform(-100, 300)) for i in range(60)]
+        for cell_size, max_distance in ((10, 30), (3, 30), (50, 30), (10, 5), (7, 100)):
+            locator = TownLocator(towns, cell_size=cell_size, max_distance=max_distance)
+            for _ in range(2000):
+                x, y = rng.uniform(-150, 550), rng.uniform(-250, 450)
+                self.assertEqual(locate_km(locator, x, y), brute_force(towns, x, y, max_distance), (cell_size, max_distance, x, y))
+
+    def test_nearer_point_in_next_cell(self):
+        # 同一格的點比相鄰格的點遠時，不能只搜尋所在的格子
+        locator = TownLocator([town("same", 0.5, 5), town("next", 10.5, 5)], cell_size=10, max_distance=30)
+        self.assertEqual(locate_km(locator, 9.9, 5), ("測試縣", "next"))
+        self.assertEqual(locate_km(locator, 1, 5), ("測試縣", "same"))
+
+    def test_ring_early_exit(self):
+        # 第一圈沒有點時繼續搜尋第二圈；已找到的點比下一圈近時不再搜尋外圈
+        locator = TownLocator([town("far", 25, 5), town("farther", -24, 5)], cell_size=10, max_distance=30)
+        self.assertEqual(locate_km(locator, 5, 5), ("測試縣", "far"))
+        locator = TownLocator([town("near", 6, 5), town("ring2", 21, 5)], cell_size=10, max_distance=30)
+        self.assertEqual(locate_km(locator, 9.5, 5), ("測試縣", "near"))
+        self.assertEqual(locate_km(locator, 19.9, 5), ("測試縣", "ring2"))
+
+    def test_max_distance_cutoff(self):
+        locator = TownLocator([town("only", 0, 0)], cell_size=10, max_distance=30)
+        self.assertEqual(locate_km(locator, 29.9, 0), ("測試縣", "only"))
+        self.assertEqual(locate_km(locator, 0, -29.9), ("測試縣", "only"))
+        self.assertIsNone(locate_km(locator, 30.1, 0))
+        self.assertIsNone(locate_km(locator, 21.3, 21.3))
+        self.assertEqual(locator.stats(), {"towns": 1, "hits": 2, "misses": 2})
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "Township.json")
+            self.assertIsNone(TownLocator.from_file(path))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"source": "test", "towns": [list(town("only", 0, 0))]}, f)
+            self.assertEqual(locate_km(TownLocator.from_file(path), 1, 1), ("測試縣", "only"))
+
+
+if __name__ == "__main__":
+    unittest.main()